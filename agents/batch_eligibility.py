@@ -0,0 +1,140 @@
+# agents/batch_eligibility.py
+"""
+Batch eligibility evaluation over JSONL applications.
+
+Input: one JSON object per line, {"service_key": ..., "form_data": {...}} plus an
+optional "id". Output: one JSON object per line, in input order, with the decision,
+reasons and required documents, or an "error" for a record that can't be read.
+Unreadable answers are reported as for a single applicant: not eligible, with the
+problem among the reasons.
+
+    python -m agents.batch_eligibility applications.jsonl -o decisions.jsonl --workers 4
+"""
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List
+
+from agents.service_rules import UNSUPPORTED_SERVICE, get_service
+
+def evaluate_eligibility_batch(service_key: str, forms: List[dict]) -> List[dict]:
+    """
+    Evaluates many applications for one service at once, column-wise, using the
+    compiled rule from agents/service_rules.py.
+    Returns one {"eligible", "reasons", "required_docs"} dict per form, matching
+    evaluate_service_eligibility (without policy references).
+    """
+    service = get_service(service_key)
+    if service is None:
+        return [{"eligible": False, "reasons": [UNSUPPORTED_SERVICE], "required_docs": []} for _ in forms]
+
+    errors = [[] for _ in forms]
+    mask = service.eligible_mask(forms, errors)
+    results = []
+    for eligible, problems in zip(mask.tolist(), errors):
+        if eligible:
+            results.append({"eligible": True, "reasons": [service.eligible_reason], "required_docs": list(service.required_docs)})
+        else:
+            results.append({"eligible": False, "reasons": [service.not_eligible_reason] + problems, "required_docs": []})
+    return results
+
+# ---------- Chunk Processing ----------
+def evaluate_records(lines: List[str]) -> List[str]:
+    """
+    Worker entry point: parses a chunk of JSONL lines, groups them by service,
+    evaluates each group column-wise and returns output lines in input order.
+    """
+    outputs: List[dict] = [None] * len(lines)
+    groups: Dict[str, List[int]] = {}
+    forms: List[dict] = [None] * len(lines)
+    for i, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+            service_key = record["service_key"]
+            if not isinstance(service_key, str):
+                raise ValueError("service_key must be a string")
+            form_data = record.get("form_data") or {}
+            if not isinstance(form_data, dict):
+                raise ValueError("form_data must be an object")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            outputs[i] = {"error": f"Invalid record: {e}"}
+            continue
+        outputs[i] = {"id": record.get("id"), "service_key": service_key}
+        forms[i] = form_data
+        groups.setdefault(service_key, []).append(i)
+
+    for service_key, idxs in groups.items():
+        for i, result in zip(idxs, evaluate_eligibility_batch(service_key, [forms[i] for i in idxs])):
+            outputs[i].update(result)
+
+    return [json.dumps(out, ensure_ascii=False) for out in outputs]
+
+def _chunks(lines: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    chunk = []
+    for line in lines:
+        if not line.strip():
+            continue
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_batch(lines: Iterable[str], out, workers: int = 1, chunk_size: int = 5000) -> dict:
+    """
+    Streams JSONL lines through the evaluator and writes JSONL results to `out`.
+    Keeps at most two chunks per worker in flight, so memory does not grow with input size.
+    Returns {"records", "seconds", "records_per_s"}.
+    """
+    start = time.perf_counter()
+    records = 0
+
+    if workers <= 1:
+        for chunk in _chunks(lines, chunk_size):
+            for line in evaluate_records(chunk):
+                out.write(line + "\n")
+            records += len(chunk)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for chunk in _chunks(lines, chunk_size):
+                pending.append(pool.submit(evaluate_records, chunk))
+                if len(pending) >= workers * 2:
+                    results = pending.popleft().result()
+                    out.writelines(line + "\n" for line in results)
+                    records += len(results)
+            while pending:
+                results = pending.popleft().result()
+                out.writelines(line + "\n" for line in results)
+                records += len(results)
+
+    seconds = time.perf_counter() - start
+    return {"records": records, "seconds": seconds, "records_per_s": records / seconds if seconds else None}
+
+# ---------- CLI Entry Point ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate eligibility for a JSONL file of applications.")
+    parser.add_argument("input", help="JSONL file of {service_key, form_data} records ('-' for stdin).")
+    parser.add_argument("-o", "--output", default="-", help="Where to write JSONL decisions (default: stdout).")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Records per worker task.")
+    args = parser.parse_args(argv)
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        stats = run_batch(src, dst, workers=args.workers, chunk_size=args.chunk_size)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    print(f"✅ {stats['records']} records in {stats['seconds']:.2f}s "
+          f"({stats['records_per_s'] or 0:,.0f} records/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,199 @@
 # agents/intent_agent.py
+import math
+import re
+import threading
+import unicodedata
+from collections import deque
+from typing import Dict, List, Optional, Tuple
 
+from agents.service_rules import COMPILED_SERVICES
+
+INTENT_EMBEDDING_MODEL = "text-embedding-3-small"
+UNSURE_CONFIDENCE = 75      # below this the keyword match is double-checked semantically
+MIN_SIMILARITY = 0.30       # cosine similarity needed to trust the semantic match
+
+# Inflections a keyword may carry and still count ("buses", "vaccinations", "گھروں").
+WORD_SUFFIXES = frozenset(["", "s", "es", "ed", "d", "ing", "ion", "ions", "ation", "ations", "وں", "یں", "ے"])
+
+# Arabic-script letters that have Urdu look-alikes, so either spelling matches.
+_CHAR_MAP = str.maketrans({"ي": "ی", "ى": "ی", "ك": "ک", "ة": "ۃ", "ه": "ہ", "ۀ": "ۂ"})
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_intent_text(text: str) -> str:
+    """
+    NFKC, lower-case, strips diacritics (e.g. the superscript alef in زکوٰۃ) and
+    unifies Arabic/Urdu letter variants.
+    """
+    text = unicodedata.normalize("NFKC", str(text)).lower().translate(_CHAR_MAP)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return _WHITESPACE.sub(" ", text).strip()
+
+# ---------- Keyword Automaton ----------
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton: finds every keyword in a text in one pass, however many
+    keywords there are. A keyword only counts as a whole word, optionally followed by
+    one of `suffixes`, so "bus" matches "buses" but not "business".
+    """
+
+    def __init__(self, keywords: Dict[str, object], suffixes=frozenset([""])):
+        self.suffixes = suffixes
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, object]]] = [[]]
+        for word, payload in keywords.items():
+            self._insert(word, payload)
+        self._link()
+
+    def _insert(self, word: str, payload):
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((word, payload))
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0) if self._goto[fail].get(ch, 0) != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[str, object]]:
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for word, payload in self._out[state]:
+                start = i - len(word) + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                end = i + 1
+                while end < len(text) and text[end].isalnum():
+                    end += 1
+                if text[i + 1:end] in self.suffixes:
+                    matches.append((word, payload))
+        return matches
+
+def _build_index() -> KeywordAutomaton:
+    keywords: Dict[str, List[Tuple[str, float]]] = {}
+    for service_key, service in COMPILED_SERVICES.items():
+        for word, weight in service.intent.get("keywords", {}).items():
+            keywords.setdefault(normalize_intent_text(word), []).append((service_key, weight))
+    return KeywordAutomaton(keywords, WORD_SUFFIXES)
+
+_INDEX = _build_index()
+_SERVICE_ORDER = {key: i for i, key in enumerate(COMPILED_SERVICES)}
+
+def rank_service_intents(user_query: str) -> List[Tuple[str, float]]:
+    """
+    Returns (service_key, score) candidates, best first. A service's score is the sum
+    of the weights of the distinct keywords found for it.
+    """
+    seen = set()
+    scores: Dict[str, float] = {}
+    for word, targets in _INDEX.find(normalize_intent_text(user_query)):
+        if word in seen:
+            continue
+        seen.add(word)
+        for service_key, weight in targets:
+            scores[service_key] = scores.get(service_key, 0.0) + weight
+    return sorted(scores.items(), key=lambda item: (-item[1], _SERVICE_ORDER[item[0]]))
+
+def _keyword_confidence(candidates: List[Tuple[str, float]]) -> int:
+    top = candidates[0][1]
+    runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+    return round(50 + 45 * min(top, 1.0) * (top - runner_up) / top)
+
+# ---------- Semantic Fallback ----------
+_centroids: Optional[Dict[str, List[float]]] = None
+_centroids_lock = threading.Lock()
+
+def _embed(openai_client, texts: List[str]) -> List[List[float]]:
+    from utils.cache import get_embedding_cache
+    from utils.llm_scheduler import INTERACTIVE, estimate_tokens, get_embedding_scheduler
+
+    cache = get_embedding_cache()
+    vectors = cache.get_many(INTENT_EMBEDDING_MODEL, texts) if cache else [None] * len(texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        batch = [texts[i] for i in missing]
+        with get_embedding_scheduler().slot(INTERACTIVE, estimate_tokens("".join(batch), 0)):
+            resp = openai_client.embeddings.create(model=INTENT_EMBEDDING_MODEL, input=batch)
+        for i, item in zip(missing, resp.data):
+            vectors[i] = item.embedding
+        if cache:
+            cache.put_many(INTENT_EMBEDDING_MODEL, [texts[i] for i in missing], [vectors[i] for i in missing])
+    return vectors
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+def _service_centroids(openai_client) -> Dict[str, List[float]]:
+    """
+    Mean embedding of each service's example queries, computed once per process.
+    """
+    global _centroids
+    if _centroids is None:
+        with _centroids_lock:
+            if _centroids is None:
+                centroids = {}
+                for service_key, service in COMPILED_SERVICES.items():
+                    examples = service.intent.get("examples", [])
+                    if not examples:
+                        continue
+                    vectors = [_unit(v) for v in _embed(openai_client, examples)]
+                    centroids[service_key] = _unit([sum(col) / len(vectors) for col in zip(*vectors)])
+                _centroids = centroids
+    return _centroids
+
+def _semantic_match(user_query: str, openai_client) -> Optional[Tuple[str, float]]:
+    try:
+        centroids = _service_centroids(openai_client)
+        query = _unit(_embed(openai_client, [user_query])[0])
+    except Exception:
+        return None
+    best = max(
+        ((key, sum(a * b for a, b in zip(query, centroid))) for key, centroid in centroids.items()),
+        key=lambda item: item[1],
+        default=None,
+    )
+    return best if best and best[1] >= MIN_SIMILARITY else None
+
+# ---------- Intent Detection ----------
 def detect_service_intent(user_query: str, openai_client=None):
     """
     Detects which public service the citizen is asking about.
+    Keywords (English, Urdu, Roman Urdu) are matched first; when that is unsure and an
+    OpenAI client is available, the query is compared with service embeddings.
     Returns: (service_key, confidence, rationale)
     """
 
-    query = user_query.lower()
+    candidates = rank_service_intents(user_query)
+    confidence = _keyword_confidence(candidates) if candidates else 0
+
+    if confidence < UNSURE_CONFIDENCE and openai_client is not None:
+        match = _semantic_match(user_query, openai_client)
+        if match:
+            service_key, similarity = match
+            rationale = COMPILED_SERVICES[service_key].intent.get("rationale", "")
+            return service_key, max(confidence, min(95, round(similarity * 100))), rationale + " (semantic match)"
 
-    # Rule-based fallback intent detection
-    if "zakat" in query or "charity" in query:
-        return "zakat", 95, "User is asking about Zakat financial support."
-    elif "transport" in query or "bus" in query or "card" in query:
-        return "ptc_transport", 90, "User is asking about a free senior transport card."
-    elif "immunization" in query or "vaccination" in query or "child health" in query:
-        return "health_immunization", 90, "User is asking about child vaccination services."
-    elif "house" in query or "housing" in query or "home" in query or "lda" in query or "shelter" in query:
-        return "housing_support", 88, "User is asking about government housing or LDA schemes."
-    else:
+    if not candidates:
         return None, 0, "Service not recognized."
+    service_key = candidates[0][0]
+    return service_key, confidence, COMPILED_SERVICES[service_key].intent.get("rationale", "")
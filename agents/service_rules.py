@@ -0,0 +1,293 @@
+# agents/service_rules.py
+"""
+Declarative service definitions and the rule engine compiled from them.
+
+Each service lists its form fields (which double as the questions shown to the
+citizen), an eligibility rule, the outcome texts, the required documents and the
+intent vocabulary (weighted English / Urdu / Roman-Urdu keywords plus example
+queries) used by agents/intent_agent.py.
+A rule is either a condition {"field", "op", "value"} or a group {"all": [...]} /
+{"any": [...]} of rules. Definitions are compiled once at import into closures,
+so evaluating a service is a dict lookup plus a few comparisons.
+"""
+import math
+import operator
+from typing import Callable, Dict, List, Optional, Tuple
+
+UNSUPPORTED_SERVICE = "⚠️ This service is not yet supported. We are working on adding it soon."
+
+YES_NO = ["Yes", "No"]
+
+SERVICE_DEFINITIONS = [
+    {
+        "key": "zakat",
+        "intent": {
+            "rationale": "User is asking about Zakat financial support.",
+            "keywords": {
+                "zakat": 1.0, "zakaat": 1.0, "charity": 0.8, "financial aid": 0.5, "financial help": 0.5,
+                "needy": 0.4, "poor": 0.3, "poverty": 0.3,
+                "sadqa": 0.6, "khairat": 0.6, "madad": 0.3,
+                "زکوۃ": 1.0, "زکات": 1.0, "خیرات": 0.8, "صدقہ": 0.6, "مالی امداد": 0.5, "مستحق": 0.4, "غریب": 0.3,
+            },
+            "examples": [
+                "I am poor and need Zakat money",
+                "How can a needy widow get financial help from the Zakat fund?",
+                "مجھے زکوۃ کی مالی امداد چاہیے",
+            ],
+        },
+        "fields": [
+            {"key": "monthly_income", "label": "Monthly household income (PKR):", "type": "number", "default": 0},
+            {"key": "is_muslim", "label": "Are you a Muslim?", "type": "select", "options": YES_NO, "default": "Yes"},
+            {"key": "is_needy", "label": "Are you financially needy?", "type": "select", "options": YES_NO, "default": "Yes"},
+        ],
+        "rule": {"all": [
+            {"field": "is_muslim", "op": "==", "value": "Yes"},
+            {"field": "is_needy", "op": "==", "value": "Yes"},
+            {"field": "monthly_income", "op": "<", "value": 60000},
+        ]},
+        "eligible_reason": "Meets Zakat criteria (Muslim, needy, income below PKR 60,000).",
+        "not_eligible_reason": "Does not meet Zakat eligibility conditions.",
+        "required_docs": ["CNIC copy", "Income certificate"],
+    },
+    {
+        "key": "ptc_transport",
+        "intent": {
+            "rationale": "User is asking about a free senior transport card.",
+            "keywords": {
+                "ptc": 1.0, "transport": 0.9, "bus": 0.9, "metro": 0.7, "travel card": 0.8, "free ride": 0.7,
+                "commute": 0.5, "senior citizen": 0.5, "card": 0.3,
+                "safar": 0.5, "buzurg": 0.4,
+                "ٹرانسپورٹ": 0.9, "میٹرو": 0.7, "بس": 0.5, "سفر": 0.5, "بزرگ": 0.4, "کارڈ": 0.3,
+            },
+            "examples": [
+                "My father is 65, can he get a free bus card?",
+                "Free metro travel for senior citizens in Lahore",
+                "بزرگ شہریوں کے لیے مفت بس کارڈ",
+            ],
+        },
+        "fields": [
+            {"key": "age", "label": "Your age:", "type": "number", "default": 0},
+            {"key": "is_senior_citizen", "label": "Are you a senior citizen?", "type": "select", "options": YES_NO, "default": "No"},
+            {"key": "has_cnic", "label": "Do you have a valid CNIC?", "type": "select", "options": YES_NO, "default": "No"},
+        ],
+        "rule": {"all": [
+            {"any": [
+                {"field": "age", "op": ">=", "value": 60},
+                {"field": "is_senior_citizen", "op": "==", "value": "Yes"},
+            ]},
+            {"field": "has_cnic", "op": "==", "value": "Yes"},
+        ]},
+        "eligible_reason": "Eligible for free transport card (Senior citizen with valid CNIC).",
+        "not_eligible_reason": "Does not meet transport card eligibility.",
+        "required_docs": ["CNIC copy", "Proof of age"],
+    },
+    {
+        "key": "health_immunization",
+        "intent": {
+            "rationale": "User is asking about child vaccination services.",
+            "keywords": {
+                "immunization": 1.0, "immunisation": 1.0, "vaccination": 1.0, "vaccine": 1.0, "child health": 0.9,
+                "polio": 0.9, "measles": 0.8, "epi": 0.8, "injection": 0.5,
+                "teeka": 0.8, "teekay": 0.8, "tika": 0.7,
+                "ویکسین": 1.0, "حفاظتی ٹیکے": 1.0, "ٹیکہ": 0.8, "ٹیکے": 0.8, "پولیو": 0.9, "خسرہ": 0.8,
+            },
+            "examples": [
+                "When should my baby get vaccinated?",
+                "Where can I get polio drops for my 2 year old child?",
+                "بچے کے حفاظتی ٹیکے کہاں لگتے ہیں",
+            ],
+        },
+        "fields": [
+            {"key": "age_months", "label": "Child's age (in months):", "type": "number", "default": 0},
+            {"key": "is_registered", "label": "Is the child registered with the EPI program?", "type": "select", "options": YES_NO, "default": "No"},
+        ],
+        "rule": {"all": [
+            {"field": "age_months", "op": "<=", "value": 60},
+            {"field": "is_registered", "op": "==", "value": "Yes"},
+        ]},
+        "eligible_reason": "Eligible for immunization (Child under 5 and registered).",
+        "not_eligible_reason": "Does not meet immunization criteria.",
+        "required_docs": ["Birth certificate", "Guardian CNIC"],
+    },
+    {
+        "key": "housing_support",
+        "intent": {
+            "rationale": "User is asking about government housing or LDA schemes.",
+            "keywords": {
+                "housing": 1.0, "lda": 1.0, "house": 0.8, "shelter": 0.8, "homeless": 0.8, "apartment": 0.7, "home": 0.6,
+                "plot": 0.6, "rent": 0.4, "flat": 0.4,
+                "apna ghar": 1.0, "makan": 0.8, "makaan": 0.8, "ghar": 0.7,
+                "ہاؤسنگ": 1.0, "ایل ڈی اے": 1.0, "مکان": 0.9, "رہائش": 0.9, "گھر": 0.7, "پلاٹ": 0.6,
+            },
+            "examples": [
+                "I have a big family and no house, is there a government scheme?",
+                "How do I apply for an LDA low-cost housing plot?",
+                "مجھے اپنا گھر چاہیے، کوئی سرکاری رہائش اسکیم ہے؟",
+            ],
+        },
+        "fields": [
+            {"key": "monthly_income", "label": "Monthly household income (PKR):", "type": "number", "default": 0},
+            {"key": "family_size", "label": "How many people are in your household?", "type": "number", "default": 0},
+            {"key": "first_time_applicant", "label": "Is this your first time applying for housing support?", "type": "select", "options": YES_NO, "default": "No"},
+            {"key": "has_property", "label": "Do you currently own any property?", "type": "select", "options": YES_NO, "default": "No"},
+        ],
+        "rule": {"all": [
+            {"field": "monthly_income", "op": "<=", "value": 80000},
+            {"field": "family_size", "op": ">=", "value": 3},
+            {"field": "first_time_applicant", "op": "==", "value": "Yes"},
+            {"field": "has_property", "op": "==", "value": "No"},
+        ]},
+        "eligible_reason": "Eligible for housing support (Low income, large family, first-time applicant, no property).",
+        "not_eligible_reason": "Does not meet housing support eligibility criteria.",
+        "required_docs": ["CNIC", "Income certificate", "No property certificate"],
+    },
+]
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# Number answers are evaluated column-wise as int64 (see eligible_mask)
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+FIELD_PARSERS = {
+    "number": int,
+    "select": str,
+    "text": str,
+}
+
+def parse_answer(field: dict, form: dict):
+    """
+    Returns the parsed answer to `field` (its default when the key is absent).
+    Raises ValueError with a citizen-readable message when the answer is None or
+    can't be parsed as the field's type. Numbers must be finite and fit in 64 bits
+    (1e400 is valid JSON, but parses to inf).
+    """
+    name = field["key"]
+    ftype = field.get("type", "text")
+    raw = form.get(name, field.get("default"))
+    if raw is None:
+        raise ValueError(f"Missing answer for '{name}'")
+    try:
+        if ftype == "number" and isinstance(raw, float) and not math.isfinite(raw):
+            raise ValueError("not finite")
+        value = FIELD_PARSERS[ftype](raw)
+        if ftype == "number" and not INT64_MIN <= value <= INT64_MAX:
+            raise ValueError("out of range")
+        return value
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid {ftype} for '{name}': {raw!r}") from None
+
+# ---------- Compiled Service ----------
+class CompiledService:
+    """
+    A service definition turned into ready-to-call pieces:
+    `questions` for the form, `evaluate(form_data)` / `is_eligible(form_data)` for one
+    applicant and `eligible_mask(forms, errors)` for a column-wise (NumPy) check of many.
+    A missing or unparseable answer fails its condition and is reported, never raised.
+    """
+
+    def __init__(self, definition: dict):
+        self.key = definition["key"]
+        self.fields = {f["key"]: f for f in definition["fields"]}
+        self.questions = [
+            {k: v for k, v in f.items() if k in ("key", "label", "type", "options", "help")}
+            for f in definition["fields"]
+        ]
+        self.eligible_reason = definition["eligible_reason"]
+        self.not_eligible_reason = definition["not_eligible_reason"]
+        self.required_docs = list(definition["required_docs"])
+        self.intent = definition.get("intent", {})
+        self._scalar = self._compile(definition["rule"])
+        self._vector = self._compile_vector(definition["rule"])
+
+    def get_questions(self) -> List[dict]:
+        return [dict(q) for q in self.questions]
+
+    def evaluate(self, form_data: dict) -> Tuple[bool, List[str]]:
+        """
+        Returns (eligible, problems): problems lists the answers that could not be read.
+        """
+        problems: List[str] = []
+        eligible = self._scalar(form_data, problems)
+        # A field used by several conditions is reported once, as in eligible_mask
+        return eligible, list(dict.fromkeys(problems))
+
+    def is_eligible(self, form_data: dict) -> bool:
+        return self._scalar(form_data, [])
+
+    def eligible_mask(self, forms: List[dict], errors: List[List[str]]):
+        """
+        Evaluates the rule for many applicants at once and returns a boolean array.
+        Unparseable values fail their condition and are appended to `errors[i]` (one
+        list per form), in the same order evaluate() reports them.
+        """
+        return self._vector(forms, {}, errors)
+
+    def _compile(self, rule: dict) -> Callable[[dict, List[str]], bool]:
+        if "all" in rule:
+            parts = [self._compile(r) for r in rule["all"]]
+            # Every part runs, so all unreadable answers are reported, not just the first
+            return lambda form, problems: all([p(form, problems) for p in parts])
+        if "any" in rule:
+            parts = [self._compile(r) for r in rule["any"]]
+            return lambda form, problems: any([p(form, problems) for p in parts])
+
+        field = self.fields[rule["field"]]
+        op, value = OPERATORS[rule["op"]], rule["value"]
+
+        def condition(form, problems):
+            try:
+                return op(parse_answer(field, form), value)
+            except ValueError as e:
+                problems.append(str(e))
+                return False
+        return condition
+
+    def _compile_vector(self, rule: dict):
+        # numpy is imported on first evaluation, not when the rules are compiled at startup
+        if "all" in rule or "any" in rule:
+            group = "all" if "all" in rule else "any"
+            parts = [self._compile_vector(r) for r in rule[group]]
+
+            def combine(forms, columns, errors):
+                import numpy as np
+
+                reduce = np.logical_and.reduce if group == "all" else np.logical_or.reduce
+                return reduce([p(forms, columns, errors) for p in parts] or [np.full(len(forms), group == "all")])
+            return combine
+
+        field = self.fields[rule["field"]]
+        name = field["key"]
+        op, value = OPERATORS[rule["op"]], rule["value"]
+
+        def condition(forms, columns, errors):
+            import numpy as np
+
+            if name not in columns:
+                number = field.get("type") == "number"
+                values = np.zeros(len(forms), dtype=np.int64) if number else np.empty(len(forms), dtype=object)
+                valid = np.ones(len(forms), dtype=bool)
+                for i, form in enumerate(forms):
+                    try:
+                        values[i] = parse_answer(field, form)
+                    except ValueError as e:
+                        valid[i] = False
+                        errors[i].append(str(e))
+                columns[name] = values, valid
+            values, valid = columns[name]
+            return np.asarray(op(values, value), dtype=bool) & valid
+        return condition
+
+def compile_services(definitions: List[dict]) -> Dict[str, CompiledService]:
+    return {d["key"]: CompiledService(d) for d in definitions}
+
+COMPILED_SERVICES: Dict[str, CompiledService] = compile_services(SERVICE_DEFINITIONS)
+
+def get_service(service_key: str) -> Optional[CompiledService]:
+    return COMPILED_SERVICES.get(service_key)
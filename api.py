@@ -0,0 +1,200 @@
+# api.py
+"""
+Headless HTTP API for the navigator pipeline.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+The blocking work (Chroma, reportlab) runs on a bounded thread pool so the event loop
+stays free; API_MAX_PENDING caps how many requests may queue for it. LLM calls
+(/evaluate, /explain, /translate) are awaited on the event loop through the async
+OpenAI client, so slow completions don't tie up pool threads.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Union
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel, Field
+
+from agents.service_rules import get_service, parse_answer
+from utils import pipeline
+from utils.llm_scheduler import get_scheduler
+from utils.vectorstore import warm_vectorstore
+
+API_WORKERS = int(os.getenv("API_WORKERS", "8"))
+API_MAX_PENDING = int(os.getenv("API_MAX_PENDING", "64"))
+
+app = FastAPI(title="Citizen Service Navigator API")
+_executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="navigator")
+_slots = None
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Runs a blocking pipeline call on the executor; rejects with 503 when the queue is full.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(API_MAX_PENDING)
+    if _slots.locked():
+        raise HTTPException(status_code=503, detail="Server busy, please retry.")
+    async with _slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, lambda: fn(*args, **kwargs))
+
+def validate_answers(service_key: str, answers: dict):
+    """
+    Checks each answer against its question's type and options; raises 422 naming the
+    first bad field. Numbers must be finite and fit in 64 bits (see parse_answer).
+    Unknown services and unknown fields are left to the pipeline.
+    """
+    service = get_service(service_key)
+    if service is None:
+        return
+    for name, field in service.fields.items():
+        if name not in answers:
+            continue
+        try:
+            value = parse_answer(field, answers)
+            if field.get("options") and value not in field["options"]:
+                raise ValueError(f"'{name}' must be one of {field['options']}, got {answers[name]!r}")
+        except ValueError as e:
+            raise HTTPException(
+                status_code=422,
+                detail=[{"loc": ["body", "answers", name], "msg": str(e), "type": "value_error"}],
+            )
+
+async def run_rules(call):
+    """
+    Awaits a rule-engine call: bad answers that get past validate_answers are still
+    the client's error (422), not a 500.
+    """
+    try:
+        return await call
+    except (TypeError, ValueError, ArithmeticError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid answers: {e}")
+
+# ---------- Request Models ----------
+class AnalyzeRequest(BaseModel):
+    query: str = Field(min_length=1)
+    degraded: bool = False
+    k: int = Field(default=3, ge=1, le=20)
+
+class EvaluateRequest(BaseModel):
+    service_key: str
+    answers: Dict[str, object] = {}
+    policy_results: List[Union[Dict[str, object], str]] = []
+    degraded: bool = False
+    translate: bool = False
+
+class EligibilityRequest(BaseModel):
+    service_key: str
+    answers: Dict[str, object] = {}
+    policy_results: List[Union[Dict[str, object], str]] = []
+
+class ExplainRequest(BaseModel):
+    service_key: str
+    answers: Dict[str, object] = {}
+    eligible: bool
+    reasons: List[str] = []
+    required_docs: List[str] = []
+    degraded: bool = False
+
+class TranslateRequest(BaseModel):
+    english_text: str
+    degraded: bool = False
+
+class PdfRequest(BaseModel):
+    service_key: str
+    answers: Dict[str, object] = {}
+    eligible: bool
+    reasons: List[str] = []
+    explanation_en: str = ""
+    required_docs: List[str] = []
+    citations: List[str] = []
+    explanation_ur: str = ""
+
+class PdfBatchRequest(BaseModel):
+    applications: List[PdfRequest] = Field(min_length=1, max_length=1000)
+
+# ---------- Endpoints ----------
+@app.on_event("startup")
+async def _startup():
+    warm_vectorstore()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "llm_available": pipeline.api_available(), "llm": get_scheduler().stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return pipeline.metrics("prometheus")
+
+@app.get("/metrics.json")
+async def metrics_json():
+    return pipeline.metrics("json")
+
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest):
+    return await run_blocking(pipeline.analyze_request, req.query, degraded=req.degraded, k=req.k)
+
+@app.get("/services/{service_key}/questions")
+async def questions(service_key: str):
+    form = pipeline.get_form(service_key)
+    if not form["questions"]:
+        raise HTTPException(status_code=404, detail=f"Unknown service: {service_key}")
+    return form
+
+@app.post("/evaluate")
+async def evaluate(req: EvaluateRequest):
+    validate_answers(req.service_key, req.answers)
+    # The rule check is microseconds; the explanation is awaited, not run on the pool
+    return await run_rules(pipeline.evaluate_request_async(
+        req.service_key, req.answers, policy_results=req.policy_results, degraded=req.degraded,
+        translate=req.translate,
+    ))
+
+@app.post("/eligibility")
+async def eligibility(req: EligibilityRequest):
+    validate_answers(req.service_key, req.answers)
+    return await run_rules(run_blocking(
+        pipeline.check_eligibility, req.service_key, req.answers, policy_results=req.policy_results
+    ))
+
+@app.post("/explain")
+async def explain(req: ExplainRequest):
+    english = await pipeline.explain_result_async(
+        req.service_key, req.answers, req.eligible, req.reasons, req.required_docs, degraded=req.degraded,
+    )
+    return {"explanation_en": english}
+
+@app.post("/translate")
+async def translate(req: TranslateRequest):
+    return await pipeline.translate_explanation_async(req.english_text, degraded=req.degraded)
+
+@app.post("/pdf")
+async def pdf(req: PdfRequest):
+    name, pdf_bytes = await run_blocking(
+        pipeline.build_application_pdf, req.service_key, req.answers, req.eligible,
+        req.reasons, req.explanation_en, req.required_docs, citations=req.citations,
+        explanation_ur=req.explanation_ur or None,
+    )
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+@app.post("/pdf/batch")
+async def pdf_batch(req: PdfBatchRequest):
+    pdf_bytes = await run_blocking(pipeline.build_application_pdfs, [a.model_dump() for a in req.applications])
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="applications.pdf"'},
+    )
@@ -1,36 +1,79 @@
 # app.py
+import hashlib
+import json
 import os
 from pathlib import Path
-from datetime import datetime
 import streamlit as st
 from dotenv import load_dotenv
 
-# === Import Agents & Utils ===
-from agents.intent_agent import detect_service_intent
-from agents.question_agent import get_questions_for_service
-from agents.eligibility_agent import evaluate_service_eligibility
-from utils.translator import get_openai_client, explain_in_english, translate_to_urdu
-from utils.pdf_filler import generate_application_pdf
-from utils.vectorstore import search_policy
-
-# ---------- Setup ----------
+# === Navigator Pipeline (in-process, or a remote api.py server) ===
 APP_ROOT = Path(__file__).parent
-FORMS_DIR = APP_ROOT / "forms"
-FORMS_DIR.mkdir(exist_ok=True, parents=True)
-
 load_dotenv(APP_ROOT / ".env")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
+NAVIGATOR_API_URL = os.getenv("NAVIGATOR_API_URL", "").strip()
+
+# Only the thin pipeline module is imported here; langchain/Chroma, reportlab and
+# openai load on first use and are shared by every session (see utils/pipeline.py).
+@st.cache_resource(show_spinner=False)
+def _api_client(base_url):
+    from utils.api_client import NavigatorAPIClient
+    return NavigatorAPIClient(base_url)
+
+if NAVIGATOR_API_URL:
+    navigator = _api_client(NAVIGATOR_API_URL)
+else:
+    from utils import pipeline as navigator
+    from utils.vectorstore import warm_vectorstore, get_vectorstore_stats
+    from utils.tracing import set_tracing, tracing_enabled
 
 # ---------- Streamlit Page ----------
 st.set_page_config(page_title="Citizen Service Navigator", page_icon="🧭", layout="wide")
 st.title("🧭 Citizen Service Navigator – AI Multi-Agent Demo")
 
+if not NAVIGATOR_API_URL:
+    @st.cache_resource(show_spinner=False)
+    def _warm_policy_index():
+        # Runs once per process; opens the shared vector store in the background.
+        return warm_vectorstore()
+
+    _warm_policy_index()
+
 # ---------- Sidebar Settings ----------
 st.sidebar.header("⚙️ Settings")
 degraded_mode = st.sidebar.toggle("Degraded Mode (offline/low-cost)", value=False)
-api_available = bool(OPENAI_API_KEY)
+api_available = navigator.api_available()
 st.sidebar.write(f"🔑 OpenAI API: {'✅ Available' if api_available else '❌ Missing'}")
-openai_client = get_openai_client(OPENAI_API_KEY) if (api_available and not degraded_mode) else None
+if NAVIGATOR_API_URL:
+    st.sidebar.write(f"🌐 Navigator API: {NAVIGATOR_API_URL}")
+else:
+    with st.sidebar.expander("📊 Retrieval Timing"):
+        stats = get_vectorstore_stats()
+        fmt = lambda s: f"{s * 1000:.1f} ms" if s is not None else "—"
+        st.write(f"Cold opens: {stats['cold_opens']} (last: {fmt(stats['last_cold_open_s'])})")
+        st.write(f"Queries: {stats['queries']} (last: {fmt(stats['last_query_s'])}, avg: {fmt(stats['avg_query_s'])})")
+        st.write(f"Result cache: {stats['results_cache']['hits']} hits / {stats['results_cache']['misses']} misses")
+
+# The latency panel (and its process-wide tracing switch) is for operators only
+if os.getenv("NAVIGATOR_ADMIN", "0") == "1":
+    with st.sidebar.expander("🛠️ Admin: Pipeline Latency"):
+        if not NAVIGATOR_API_URL:
+            # Tracing is process-wide: only flip it when the admin actually changes it
+            tracing = st.toggle("Enable tracing", value=tracing_enabled())
+            if tracing != tracing_enabled():
+                set_tracing(tracing)
+        metrics = navigator.metrics("json")
+        if not metrics["enabled"]:
+            st.caption("Tracing is off (set NAVIGATOR_TRACING=1 to record timings).")
+        if metrics["stages"]:
+            st.dataframe(
+                [{"stage": name, "n": m["count"], "p50 ms": round(m["p50_ms"], 1),
+                  "p95 ms": round(m["p95_ms"], 1), "p99 ms": round(m["p99_ms"], 1)}
+                 for name, m in metrics["stages"].items()],
+                hide_index=True,
+            )
+        for name, value in metrics["counters"].items():
+            st.write(f"{name}: {value}")
+        st.download_button("⬇️ Prometheus", navigator.metrics("prometheus"), file_name="navigator_metrics.prom")
+        st.download_button("⬇️ JSON", json.dumps(metrics, indent=2, ensure_ascii=False), file_name="navigator_metrics.json")
 
 # ---------- Initialise Session State ----------
 for key, default in {
@@ -39,6 +82,7 @@ for key, default in {
     "policy_results": [],
     "form_submitted": False,
     "answers": {},
+    "eligibility_result": None,
 }.items():
     st.session_state.setdefault(key, default)
 
@@ -56,8 +100,9 @@ if st.button("🔍 Analyze Request", key="analyze_button"):
         st.warning("⚠️ Please enter your situation first.")
         st.stop()
 
-    # 🔍 Step 1: Intent Detection
-    service_key, confidence, rationale = detect_service_intent(user_text, openai_client=openai_client)
+    # 🔍 Step 1 + 2: Intent Detection and Policy Retrieval
+    analysis = navigator.analyze_request(user_text, degraded=degraded_mode, k=3)
+    service_key = analysis["service_key"]
     if not service_key:
         st.error("⚠️ Sorry, this service is not yet supported. We are working on adding it soon.")
         st.stop()
@@ -65,11 +110,9 @@ if st.button("🔍 Analyze Request", key="analyze_button"):
     # Store in session state
     st.session_state.service_key = service_key
     st.session_state.analysis_done = True
-    st.session_state.confidence = confidence
-    st.session_state.rationale = rationale
-
-    # 🔍 Step 2: Retrieve Policy Sections
-    st.session_state.policy_results = search_policy(user_text, k=3)
+    st.session_state.confidence = analysis["confidence"]
+    st.session_state.rationale = analysis["rationale"]
+    st.session_state.policy_results = analysis["policy_results"]
 
 # ---------- Step 2: Show Detected Service + Policy ----------
 if st.session_state.analysis_done and st.session_state.service_key:
@@ -82,13 +125,15 @@ if st.session_state.analysis_done and st.session_state.service_key:
     # 📜 Relevant Policy Sections
     if st.session_state.policy_results:
         st.markdown("### 📜 Relevant Policy Sections from Official Documents")
-        for idx, section in enumerate(st.session_state.policy_results, 1):
-            with st.expander(f"📑 Policy Section {idx}"):
-                st.write(section)
+        for idx, hit in enumerate(st.session_state.policy_results, 1):
+            with st.expander(f"📑 {idx}. {hit['citation']}"):
+                st.markdown(f"> {hit['snippet']}")
+                st.caption(f"Relevance score: {hit['score']:.3f}")
+                st.write(hit["text"])
 
     # ---------- Step 3: Dynamic Form ----------
     st.markdown("### 2️⃣ Provide Required Information")
-    questions = get_questions_for_service(service_key)
+    questions = navigator.get_form(service_key)["questions"]
 
     with st.form(key=f"dynamic_form_{service_key}", clear_on_submit=False):
         answers = {}
@@ -114,55 +159,70 @@ if st.session_state.analysis_done and st.session_state.service_key:
         st.session_state.form_submitted = True
 
 # ---------- Step 4: Eligibility Decision ----------
+def submission_key(service_key, answers, policy_results, degraded):
+    """
+    Hash of everything the result depends on; the result is recomputed only when it changes.
+    """
+    payload = json.dumps([service_key, answers, policy_results, degraded], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+@st.cache_resource(show_spinner=False)
+def _pdf_worker():
+    # One small pool per process: PDFs render in the background while the page streams
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=int(os.getenv("PDF_WORKERS", "2")), thread_name_prefix="pdf")
+
+@st.fragment(run_every=0.5)
+def pdf_progress(result):
+    """
+    Polls the background PDF job and reruns the page once it has finished (either way).
+    """
+    future = result["pdf_future"]
+    if not future.done():
+        st.caption("⏳ Preparing your application PDF…")
+        return
+    try:
+        result["pdf_name"], result["pdf_bytes"] = future.result()
+    except Exception as e:
+        # Recorded so the rerun shows the error once instead of polling again
+        result["pdf_error"] = str(e) or type(e).__name__
+    st.rerun()
+
 if st.session_state.get("form_submitted", False):
     service_key = st.session_state.service_key
     answers = st.session_state.answers
-    policy_context = "\n\n".join(st.session_state.policy_results) if st.session_state.policy_results else ""
 
     st.markdown("### 3️⃣ Eligibility Result")
 
-    eligible, reasons, required_docs = evaluate_service_eligibility(
-        service_key=service_key, 
-        form_data=answers, 
-        policy_context=policy_context
-    )
-
+    # The rule check is instant; the explanation, translation and PDF fill in after it
+    result_key = submission_key(service_key, answers, st.session_state.policy_results, degraded_mode)
+    result = st.session_state.eligibility_result
+    if result is None or result["key"] != result_key:
+        decision = navigator.check_eligibility(service_key, answers, policy_results=st.session_state.policy_results)
+        result = {
+            "key": result_key,
+            "eligible": decision["eligible"],
+            "reasons": decision["reasons"],
+            "required_docs": decision["required_docs"],
+            "citations": decision.get("citations", []),
+            "english": None,
+            "urdu": None,
+            "pdf_future": None,
+            "pdf_name": None,
+            "pdf_bytes": None,
+            "pdf_error": None,
+        }
+        st.session_state.eligibility_result = result
+        if decision["eligible"] and hasattr(navigator, "prepare_application_pdf"):
+            # Renderer setup overlaps the streaming below; it never waits on anything
+            _pdf_worker().submit(navigator.prepare_application_pdf, service_key)
+
+    eligible, reasons, required_docs = result["eligible"], result["reasons"], result["required_docs"]
     if eligible:
         st.success("🎉 You are **Eligible** for this service!")
     else:
         st.error("❌ You are **Not Eligible** based on the information provided.")
 
-    # ✅ English Explanation (Safe + Always Shows)
-    english_exp = explain_in_english(
-        client=openai_client,
-        service_key=service_key,
-        form_data=answers,
-        eligible=eligible,
-        reasons=reasons,
-        required_docs=required_docs,
-        degraded=degraded_mode,
-    )
-
-    if not english_exp or len(english_exp.strip()) < 5:
-        english_exp = (
-            "✅ Eligibility check complete.\n\n"
-            + "Reason(s): " + "; ".join(reasons if reasons else ["No reasons provided."]) + "\n\n"
-            + "📜 Policy Reference: Based on available documents.\n\n"
-            + ("📁 Required documents: " + ", ".join(required_docs) if required_docs else "")
-        )
-
-    st.subheader("📜 Explanation (English)")
-    st.markdown(english_exp)
-
-    # ✅ Urdu Translation (Safe Fallback)
-    urdu_exp = translate_to_urdu(
-        client=openai_client,
-        english_text=english_exp,
-        degraded=degraded_mode
-    )
-    st.subheader("📜 تشریح (Urdu)")
-    st.write(urdu_exp)
-
     # ✅ Required Documents Section
     st.subheader("📁 Required Documents")
     if required_docs:
@@ -170,27 +230,52 @@ if st.session_state.get("form_submitted", False):
     else:
         st.write("• None required.")
 
+    if result["citations"]:
+        st.caption("Sources: " + "; ".join(result["citations"]))
+
+    # ✅ English Explanation — streamed token by token
+    st.subheader("📜 Explanation (English)")
+    if result["english"] is None and hasattr(navigator, "stream_explanation"):
+        result["english"] = st.write_stream(navigator.stream_explanation(
+            service_key, answers, eligible, reasons, required_docs, degraded=degraded_mode
+        ))
+    elif result["english"] is None:
+        result["english"] = navigator.explain_result(
+            service_key, answers, eligible, reasons, required_docs, degraded=degraded_mode
+        )
+        st.markdown(result["english"])
+    else:
+        st.markdown(result["english"])
+
+    # ✅ Urdu Translation (Safe Fallback) — streamed as soon as the English text is ready
+    st.subheader("📜 تشریح (Urdu)")
+    if result["urdu"] is None and hasattr(navigator, "stream_translation"):
+        result["urdu"] = st.write_stream(navigator.stream_translation(result["english"], degraded=degraded_mode))
+    elif result["urdu"] is None:
+        result["urdu"] = navigator.translate_explanation(result["english"], degraded=degraded_mode)["explanation_ur"]
+        st.write(result["urdu"])
+    else:
+        st.write(result["urdu"])
+
+    # The PDF job is only submitted once both explanations exist, so it never blocks a worker
+    if eligible and result["pdf_future"] is None and result["pdf_bytes"] is None:
+        result["pdf_future"] = _pdf_worker().submit(
+            navigator.build_application_pdf, service_key, answers, eligible, reasons, result["english"],
+            required_docs, citations=result["citations"], explanation_ur=result["urdu"],
+        )
+
     # ---------- Step 5: PDF Generation ----------
     if eligible:
         st.markdown("### 4️⃣ Generate Application PDF")
-        pdf_name = f"{service_key}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.pdf"
-        pdf_path = FORMS_DIR / pdf_name
-
-        generate_application_pdf(
-            service_key=service_key,
-            form_data=answers,
-            eligibility=eligible,
-            reasons=reasons,
-            explanation_en=english_exp,
-            required_docs=required_docs,
-            file_path=pdf_path,
-        )
-
-        with open(pdf_path, "rb") as f:
+        if result["pdf_error"]:
+            st.error(f"⚠️ Could not generate the PDF: {result['pdf_error']}")
+        elif result["pdf_bytes"] is None:
+            pdf_progress(result)
+        else:
             st.download_button(
                 label="⬇️ Download Application PDF",
-                data=f.read(),
-                file_name=pdf_name,
+                data=result["pdf_bytes"],
+                file_name=result["pdf_name"],
                 mime="application/pdf",
             )
 
@@ -0,0 +1,159 @@
+# benchmarks/fakes.py
+"""
+Deterministic local stand-ins for OpenAI and Chroma, so benchmarks run offline.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+
+# ---------- Embeddings ----------
+class FakeEmbeddings:
+    """
+    Feature-hashing embeddings: every token adds a fixed pseudo-random unit vector, so
+    texts that share words are close. Same text → same vector, on every machine.
+    """
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.model = f"fake-hash-{dim}"
+        self.calls = 0
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN.findall(text.lower()):
+            vec += self._token_vector(token)
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+# ---------- Vector Store ----------
+class _Doc:
+    __slots__ = ("page_content", "metadata")
+
+    def __init__(self, page_content: str, metadata: dict):
+        self.page_content = page_content
+        self.metadata = metadata
+
+class FakeVectorStore:
+    """
+    In-memory brute-force (NumPy) replacement for the Chroma handle used by search_policy.
+    """
+
+    def __init__(self, embeddings, dim: Optional[int] = None):
+        self.embeddings = embeddings
+        self.dim = dim or getattr(embeddings, "dim", None)
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._services = np.zeros(0, dtype=object)
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None, vectors=None):
+        metadatas = metadatas or [{} for _ in texts]
+        if vectors is None:
+            vectors = self.embeddings.embed_documents(list(texts))
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        self._matrix = np.vstack([self._matrix, np.asarray(vectors, dtype=np.float32)])
+        self._services = np.concatenate([self._services, np.array([m.get("service", "") for m in metadatas], dtype=object)])
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k: int = 4, filter: Optional[dict] = None):
+        """
+        (doc, distance) pairs, nearest first; distance is 1 - cosine as in Chroma's cosine space.
+        """
+        scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+        if filter and "service" in filter:
+            scores = np.where(self._services == filter["service"], scores, -np.inf)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(_Doc(self.texts[i], self.metadatas[i]), 1.0 - float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filter: Optional[dict] = None):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, filter=filter)
+
+# ---------- Chat Completions Server ----------
+class FakeChatServer:
+    """
+    Local OpenAI-compatible /v1/chat/completions endpoint with a configurable delay.
+    Point a real client at it: OpenAI(api_key="fake", base_url=server.base_url).
+
+        with FakeChatServer(latency=0.2) as server:
+            ...
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.requests = 0
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("content-length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                outer.requests += 1
+                if outer.latency:
+                    time.sleep(outer.latency)
+                prompt = body.get("messages", [{}])[-1].get("content", "")
+                reply = f"[fake {body.get('model', 'model')}] " + " ".join(prompt.split()[:40])
+                payload = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": reply}}],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(reply.split()),
+                              "total_tokens": len(prompt.split()) + len(reply.split())},
+                }
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
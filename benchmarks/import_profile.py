@@ -0,0 +1,76 @@
+# benchmarks/import_profile.py
+"""
+Import-time profile of the app's modules, from `python -X importtime`.
+
+    python -m benchmarks.import_profile                       # utils.pipeline (what app.py loads)
+    python -m benchmarks.import_profile utils.vectorstore langchain_community.vectorstores --top 15
+    python -m benchmarks.import_profile --json > imports.json
+
+Each module is imported in a fresh interpreter, so the numbers are cold-start costs.
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_MODULES = ["utils.pipeline", "streamlit"]
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def profile_import(module: str) -> dict:
+    """
+    Returns {"module", "total_ms", "imports": [{"module", "self_ms", "cumulative_ms", "depth"}]}.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+        return {"module": module, "error": error}
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": (len(indent) - 1) // 2,
+            })
+    top_level = [i for i in imports if i["depth"] == 0]
+    return {
+        "module": module,
+        "total_ms": sum(i["cumulative_ms"] for i in top_level),
+        "module_count": len(imports),
+        "imports": imports,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile cold import time of app modules.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per module.")
+    parser.add_argument("--json", action="store_true", help="Print the raw profile as JSON.")
+    args = parser.parse_args(argv)
+
+    profiles = [profile_import(m) for m in args.modules]
+    if args.json:
+        print(json.dumps(profiles, indent=2))
+        return
+
+    for prof in profiles:
+        if "error" in prof:
+            print(f"❌ {prof['module']}: {prof['error']}")
+            continue
+        print(f"📦 {prof['module']}: {prof['total_ms']:.1f} ms, {prof['module_count']} modules")
+        slowest = sorted(prof["imports"], key=lambda i: i["cumulative_ms"], reverse=True)[:args.top]
+        for imp in slowest:
+            print(f"   {imp['cumulative_ms']:9.1f} ms  (self {imp['self_ms']:7.1f})  {imp['module']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+# benchmarks/run.py
+"""
+Reproducible, offline benchmark suite.
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --suites search scale --scale 10000 100000 1000000
+    python -m benchmarks.run --suites ann --ann-rows 1000000   # recall@k vs latency
+    python -m benchmarks.run --out new.json --compare bench.json
+
+OpenAI is replaced by FakeEmbeddings / FakeChatServer and Chroma by FakeVectorStore or
+an in-memory DenseIndex (see benchmarks/fakes.py), so runs are deterministic and need
+no network. LLM calls get their own unthrottled scheduler. The shared
+cache is pinned to an in-process backend, so a run never reads a previous run's
+entries (or writes into the machine's shared cache). Results are written as JSON: {"meta": {...}, "results": {name: {...}}}.
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+QUERIES = [
+    "My father is 65 and lives in Lahore. Can he get a free transport card?",
+    "How much Zakat can a needy widow receive?",
+    "When should my child get the polio vaccine?",
+    "Is there an LDA housing scheme for low income families?",
+    "free bus card for my father",
+    "documents required for immunization registration",
+]
+
+# ---------- Timing ----------
+def measure(fn, min_seconds: float = 1.0, min_ops: int = 5, max_ops: int = 100_000, warmup: int = 2) -> dict:
+    """
+    Calls fn repeatedly and returns throughput plus latency percentiles (ms).
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < max_ops and (len(samples) < min_ops or time.perf_counter() - start < min_seconds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    samples.sort()
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {
+        "ops": len(samples),
+        "ops_per_s": len(samples) / total,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+def _random_form(rng: random.Random) -> dict:
+    yn = lambda: rng.choice(["Yes", "No"])
+    return {
+        "monthly_income": rng.randint(0, 120000), "family_size": rng.randint(1, 9),
+        "age": rng.randint(0, 90), "age_months": rng.randint(0, 120),
+        "is_muslim": yn(), "is_needy": yn(), "is_senior_citizen": yn(), "has_cnic": yn(),
+        "is_registered": yn(), "first_time_applicant": yn(), "has_property": yn(),
+    }
+
+# ---------- Suites ----------
+def suite_search(args) -> dict:
+    """
+    Index build + search_policy over the real data/*.pdf corpus, with fake embeddings.
+    """
+    from benchmarks.fakes import FakeEmbeddings, FakeVectorStore
+    from utils import vectorstore
+    from utils.chunking import split_policy_pages
+    from utils.lexical_index import BM25Index
+
+    embeddings = FakeEmbeddings(dim=args.dim)
+    vectordb = FakeVectorStore(embeddings)
+    lexical = BM25Index()
+
+    pdf_files = sorted(vectorstore.DATA_DIR.glob("*.pdf"))
+    start = time.perf_counter()
+    pages = chunks = 0
+    for pdf_file, docs, _ in vectorstore._iter_parsed_pdfs(pdf_files, args.workers):
+        pages += len(docs)
+        split_docs = split_policy_pages(docs, pdf_file.name)
+        vectorstore._tag_chunks(split_docs, pdf_file.name)
+        texts = [d.page_content for d in split_docs]
+        metadatas = [d.metadata for d in split_docs]
+        ids = vectorstore._chunk_ids(pdf_file.name, split_docs)
+        for cid, metadata in zip(ids, metadatas):
+            metadata["chunk_id"] = cid
+        vectordb.add_texts(texts, metadatas)
+        lexical.add(ids, texts, metadatas)
+        chunks += len(split_docs)
+    lexical.search("warm up")
+    build_s = time.perf_counter() - start
+
+    results = {"index_build": {"files": len(pdf_files), "pages": pages, "chunks": chunks,
+                               "seconds": build_s, "chunks_per_s": chunks / build_s if build_s else None}}
+
+    vectorstore.use_vectorstore(vectordb, lexical)
+    try:
+        for backend in ("vector", "lexical", "hybrid"):
+            queries = itertools.cycle(QUERIES)
+            results[f"search_policy.{backend}"] = measure(
+                lambda: vectorstore.search_policy(next(queries), k=3, backend=backend, use_cache=False),
+                min_seconds=args.seconds,
+            )
+        queries = itertools.cycle(QUERIES)
+        results["search_policy.cached"] = measure(
+            lambda: vectorstore.search_policy(next(queries), k=3, backend="vector"), min_seconds=args.seconds
+        )
+    finally:
+        vectorstore.invalidate_vectorstore()
+    return results
+
+def suite_scale(args) -> dict:
+    """
+    search_policy_hits over the dense index on synthetic corpora of args.scale chunks,
+    with fake query embeddings (in VECTOR_INDEX mode, exact when that is "chroma").
+    """
+    import numpy as np
+    from benchmarks.fakes import FakeEmbeddings
+    from utils import vectorstore
+    from utils.lexical_index import BM25Index
+
+    results = {}
+    rng = np.random.default_rng(args.seed)
+    embeddings = FakeEmbeddings(dim=args.dim)
+    mode = vectorstore.VECTOR_INDEX
+    if mode == "chroma":
+        vectorstore.VECTOR_INDEX = "exact"
+    try:
+        for n in args.scale:
+            # Dense hits take their text from the lexical index, so both hold every chunk
+            index, lexical = vectorstore._new_dense_index(), BM25Index()
+            for start in range(0, n, 100_000):
+                ids = [f"chunk-{i}" for i in range(start, min(n, start + 100_000))]
+                metadatas = [{"service": ""}] * len(ids)
+                index.add(ids, rng.standard_normal((len(ids), args.dim), dtype=np.float32), metadatas)
+                lexical.add(ids, [f"chunk {cid}" for cid in ids], metadatas)
+            vectorstore.use_vectorstore(lexical=lexical, dense=index, embeddings=embeddings)
+            queries = itertools.cycle(QUERIES)
+            results[f"search_policy.{vectorstore.VECTOR_INDEX}.{n}"] = measure(
+                lambda: vectorstore.search_policy_hits(next(queries), k=3, backend="vector", use_cache=False),
+                min_seconds=args.seconds,
+            )
+            vectorstore.invalidate_vectorstore()
+            del index, lexical
+    finally:
+        vectorstore.VECTOR_INDEX = mode
+        vectorstore.invalidate_vectorstore()
+    return results
+
+def suite_ann(args) -> dict:
+    """
+    Recall@k vs latency of the dense index modes and storage types, against exact
+    float32 search, on a clustered synthetic corpus of args.ann_rows vectors.
+    """
+    import tempfile
+    import numpy as np
+    from utils.vector_index import DenseIndex
+
+    rng = np.random.default_rng(args.seed)
+    n, k = args.ann_rows, args.ann_k
+    centers = rng.standard_normal((max(1, n // 200), args.dim), dtype=np.float32)
+    matrix = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, args.dim), dtype=np.float32)
+    queries = matrix[rng.choice(n, 200, replace=False)] + 0.3 * rng.standard_normal((200, args.dim), dtype=np.float32)
+    ids = [str(i) for i in range(n)]
+    metadatas = [{"service": ""}] * n
+
+    configs = [("exact", "float32", {}), ("exact", "float16", {}), ("exact", "int8", {})]
+    configs += [("ivf", "float16", {"ivf_nprobe": p}) for p in (1, 4, 16, 64)]
+    try:
+        import hnswlib  # noqa: F401
+        configs += [("hnsw", "float16", {"hnsw_ef_search": ef}) for ef in (16, 64, 256)]
+    except ImportError:
+        print("⚠️ hnswlib not installed; skipping HNSW configurations.")
+
+    results, truth = {}, None
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in sorted({dtype for _, dtype, _ in configs}):
+            index = DenseIndex(dtype=dtype)
+            index.add(ids, matrix, metadatas)
+            index.save(Path(tmp) / dtype)
+        for mode, dtype, params in configs:
+            index = DenseIndex.load(Path(tmp) / dtype, mode=mode, params=params)
+            start = time.perf_counter()
+            index.search(queries[0], k=k)  # builds the ANN structure
+            build_s = time.perf_counter() - start
+            found = [{doc_id for doc_id, _ in index.search(q, k=k)} for q in queries]
+            if truth is None:
+                truth = found
+            recall = statistics.fmean(len(f & t) / len(t) for f, t in zip(found, truth))
+            vectors = itertools.cycle(queries)
+            name = f"{mode}.{dtype}" + "".join(f".{key}_{value}" for key, value in params.items())
+            results[name] = {
+                f"recall_at_{k}": recall, "build_s": build_s, "matrix_bytes": index.stats()["matrix_bytes"],
+                **measure(lambda: index.search(next(vectors), k=k), min_seconds=args.seconds),
+            }
+    return results
+
+def suite_eligibility(args) -> dict:
+    import io
+    from agents.eligibility_agent import evaluate_service_eligibility
+    from agents.batch_eligibility import run_batch
+
+    rng = random.Random(args.seed)
+    services = ["zakat", "ptc_transport", "health_immunization", "housing_support"]
+    forms = [(rng.choice(services), _random_form(rng)) for _ in range(10_000)]
+    it = itertools.cycle(forms)
+    results = {"evaluate_service_eligibility": measure(
+        lambda: evaluate_service_eligibility(*next(it)), min_seconds=args.seconds
+    )}
+
+    lines = [json.dumps({"id": i, "service_key": s, "form_data": f}) for i, (s, f) in enumerate(forms * 10)]
+    for workers in (1, args.workers):
+        stats = run_batch(lines, io.StringIO(), workers=workers)
+        results[f"batch.workers_{workers}"] = stats
+    return results
+
+def suite_pdf(args) -> dict:
+    from utils.pdf_filler import render_application_pdf, render_application_pdfs, wrap_text
+
+    rng = random.Random(args.seed)
+    explanation = " ".join(rng.choice(["eligible", "documents", "CNIC", "office", "Lahore", "support"])
+                           for _ in range(400))
+    return {
+        "wrap_text": measure(lambda: wrap_text(explanation, 110), min_seconds=args.seconds),
+        "render_application_pdf": measure(
+            lambda: render_application_pdf(
+                "zakat", _random_form(rng), True, ["Meets Zakat criteria."], explanation, ["CNIC copy"]
+            ),
+            min_seconds=args.seconds,
+        ),
+        "render_application_pdfs.batch_100": measure(
+            lambda: render_application_pdfs([
+                {"service_key": "zakat", "form_data": _random_form(rng), "eligibility": True,
+                 "reasons": ["Meets Zakat criteria."], "explanation_en": explanation, "required_docs": ["CNIC copy"]}
+                for _ in range(100)
+            ], combine=True),
+            min_seconds=args.seconds, min_ops=2,
+        ),
+    }
+
+def suite_llm(args) -> dict:
+    """
+    explain_in_english / translate_to_urdu against a local fake chat server.
+    """
+    from openai import OpenAI
+    from benchmarks.fakes import FakeChatServer
+    from utils.llm_scheduler import LLMScheduler, get_scheduler, set_scheduler
+    from utils.translator import explain_in_english, translate_to_urdu
+
+    results = {}
+    # A dedicated, unthrottled scheduler: the process-wide one's RPM budget would be measured instead
+    previous = get_scheduler()
+    set_scheduler(LLMScheduler(max_concurrency=args.workers, requests_per_minute=0, tokens_per_minute=0))
+    try:
+        with FakeChatServer(latency=args.llm_latency) as server:
+            client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+            counter = iter(range(10**9))
+            results["explain_in_english"] = measure(
+                lambda: explain_in_english(client, "zakat", {}, True, [f"reason {next(counter)}"], ["CNIC copy"]),
+                min_seconds=args.seconds,
+            )
+            results["translate_to_urdu"] = measure(
+                lambda: translate_to_urdu(client, f"You are eligible ({next(counter)})."), min_seconds=args.seconds
+            )
+            results["explain_in_english.cached"] = measure(
+                lambda: explain_in_english(client, "zakat", {}, True, ["same reason"], ["CNIC copy"]),
+                min_seconds=args.seconds,
+            )
+            results["fake_server"] = {"latency_s": args.llm_latency, "requests": server.requests}
+    finally:
+        set_scheduler(previous)
+    return results
+
+SUITES = {
+    "search": suite_search,
+    "scale": suite_scale,
+    "ann": suite_ann,
+    "eligibility": suite_eligibility,
+    "pdf": suite_pdf,
+    "llm": suite_llm,
+}
+
+# ---------- Reporting ----------
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def compare(new: dict, old: dict):
+    """
+    Prints throughput / p50 changes for every result present in both runs.
+    """
+    print(f"{'benchmark':45} {'old ops/s':>12} {'new ops/s':>12} {'Δ':>8} {'old p50':>9} {'new p50':>9}")
+    for name, cur in new["results"].items():
+        prev = old.get("results", {}).get(name)
+        if not prev or "ops_per_s" not in cur or "ops_per_s" not in prev:
+            continue
+        change = (cur["ops_per_s"] / prev["ops_per_s"] - 1) * 100 if prev["ops_per_s"] else 0.0
+        print(f"{name:45} {prev['ops_per_s']:12,.1f} {cur['ops_per_s']:12,.1f} {change:+7.1f}% "
+              f"{prev['p50_ms']:8.2f}ms {cur['p50_ms']:8.2f}ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("--suites", nargs="+", choices=sorted(SUITES), default=sorted(SUITES))
+    parser.add_argument("--out", help="Write JSON results here (default: stdout).")
+    parser.add_argument("--compare", help="Previous JSON results to compare against.")
+    parser.add_argument("--scale", nargs="+", type=int, default=[10_000, 100_000],
+                        help="Synthetic corpus sizes (chunks) for the scale suite.")
+    parser.add_argument("--dim", type=int, default=256, help="Fake embedding dimension.")
+    parser.add_argument("--ann-rows", type=int, default=100_000, help="Corpus size for the ann suite.")
+    parser.add_argument("--ann-k", type=int, default=10, help="k for recall@k in the ann suite.")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Minimum time per measurement.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake chat server delay (s).")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes for parallel stages.")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    from utils.cache import TTLCache, set_cache_backend
+    set_cache_backend(TTLCache(maxsize=100_000))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+        },
+        "results": {},
+        "skipped": {},
+    }
+    for name in args.suites:
+        print(f"⏱️ Running {name}...", file=sys.stderr)
+        try:
+            for key, value in SUITES[name](args).items():
+                report["results"][f"{name}.{key}"] = value
+        except ImportError as e:
+            report["skipped"][name] = f"missing dependency: {e.name}"
+            print(f"⚠️ Skipped {name}: missing dependency {e.name}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+if __name__ == "__main__":
+    main()
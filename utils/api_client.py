@@ -0,0 +1,67 @@
+# utils/api_client.py
+import requests
+
+class NavigatorAPIClient:
+    """
+    HTTP client for api.py with the same call surface as utils/pipeline.py,
+    so app.py can run against either.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path: str, payload: dict) -> requests.Response:
+        resp = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp
+
+    def api_available(self) -> bool:
+        resp = self.session.get(f"{self.base_url}/health", timeout=self.timeout)
+        resp.raise_for_status()
+        return bool(resp.json().get("llm_available"))
+
+    def metrics(self, fmt: str = "json"):
+        path = "/metrics" if fmt == "prometheus" else "/metrics.json"
+        resp = self.session.get(f"{self.base_url}{path}", timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.text if fmt == "prometheus" else resp.json()
+
+    def analyze_request(self, query: str, degraded: bool = False, k: int = 3) -> dict:
+        return self._post("/analyze", {"query": query, "degraded": degraded, "k": k}).json()
+
+    def get_form(self, service_key: str) -> dict:
+        resp = self.session.get(f"{self.base_url}/services/{service_key}/questions", timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def evaluate_request(self, service_key: str, answers: dict, policy_results=None, degraded: bool = False) -> dict:
+        payload = {"service_key": service_key, "answers": answers,
+                   "policy_results": policy_results or [], "degraded": degraded}
+        return self._post("/evaluate", payload).json()
+
+    def check_eligibility(self, service_key: str, answers: dict, policy_results=None) -> dict:
+        payload = {"service_key": service_key, "answers": answers, "policy_results": policy_results or []}
+        return self._post("/eligibility", payload).json()
+
+    def explain_result(self, service_key, answers, eligible, reasons, required_docs, degraded: bool = False) -> str:
+        payload = {"service_key": service_key, "answers": answers, "eligible": eligible, "reasons": reasons,
+                   "required_docs": required_docs, "degraded": degraded}
+        return self._post("/explain", payload).json()["explanation_en"]
+
+    def translate_explanation(self, english_text: str, degraded: bool = False) -> dict:
+        return self._post("/translate", {"english_text": english_text, "degraded": degraded}).json()
+
+    def build_application_pdf(self, service_key, answers, eligible, reasons, explanation_en, required_docs,
+                              citations=None, explanation_ur=None):
+        payload = {"service_key": service_key, "answers": answers, "eligible": eligible, "reasons": reasons,
+                   "explanation_en": explanation_en, "required_docs": required_docs, "citations": citations or [],
+                   "explanation_ur": explanation_ur or ""}
+        resp = self._post("/pdf", payload)
+        disposition = resp.headers.get("content-disposition", "")
+        name = disposition.split("filename=")[-1].strip('"') if "filename=" in disposition else f"{service_key}.pdf"
+        return name, resp.content
+
+    def build_application_pdfs(self, applications) -> bytes:
+        return self._post("/pdf/batch", {"applications": applications}).content
@@ -0,0 +1,428 @@
+# utils/cache.py
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from utils.tracing import incr
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = BASE_DIR / ".cache"
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form used for cache keys: NFKC, lower-cased, whitespace collapsed.
+    """
+    text = unicodedata.normalize("NFKC", str(text))
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+# ---------- Embedding Cache ----------
+class EmbeddingCache:
+    """
+    On-disk (SQLite) embedding cache keyed by model name + normalized-text hash.
+    Holds about `max_entries` vectors, evicting the least recently used ones every
+    `evict_every` writes. Safe to share between threads and between processes on the same machine.
+    """
+
+    def __init__(self, path: Path = CACHE_DIR / "embeddings.sqlite3", max_entries: int = 200_000,
+                 evict_every: int = 200):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        keys = [self.key(model, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        stale: List[str] = []
+        conn = self._conn()
+        now = time.time()
+        for start in range(0, len(keys), 500):
+            part = list(dict.fromkeys(keys[start:start + 500]))
+            marks = ",".join("?" * len(part))
+            rows = conn.execute(f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({marks})", part)
+            for key, blob, last_used in rows:
+                found[key] = array("f", blob).tolist()
+                if last_used < now - 60:
+                    stale.append(key)
+        if stale:
+            # Recency only needs minute resolution; avoids a write on every hit
+            with conn:
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in stale])
+        with self._lock:
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return [found.get(k) for k in keys]
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        now = time.time()
+        rows = [(self.key(model, t), array("f", v).tobytes(), now) for t, v in zip(texts, vectors)]
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+        with self._lock:
+            before, self._writes = self._writes, self._writes + len(rows)
+            evict = before // self.evict_every != self._writes // self.evict_every
+        if evict:
+            self._evict(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else None}
+
+    def _evict(self, conn: sqlite3.Connection):
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            with conn:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads; keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Returns the process-wide embedding cache, or None when disabled (EMBEDDING_CACHE=0).
+    """
+    global _embedding_cache
+    if os.getenv("EMBEDDING_CACHE", "1") == "0":
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    path=Path(os.getenv("EMBEDDING_CACHE_PATH", CACHE_DIR / "embeddings.sqlite3")),
+                    max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+                )
+    return _embedding_cache
+
+# ---------- TTL Cache ----------
+class TTLCache:
+    """
+    Small thread-safe in-memory cache with a size bound (LRU) and per-entry time-to-live.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[object, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self, prefix: Optional[str] = None):
+        with self._lock:
+            if prefix is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if str(k).startswith(prefix)]:
+                    del self._data[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, len(self._data)
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "size": size, "hit_rate": hits / total if total else None}
+
+# ---------- Shared Cache Tier ----------
+# Backends store strings under string keys: get(key), set(key, value, ttl), clear(prefix), stats().
+# TTLCache above is the in-process LRU backend.
+class SQLiteBackend:
+    """
+    Key/value store in one SQLite file, shared by every process on the machine.
+    Expired entries are skipped on read; the least recently used ones beyond
+    `max_entries` are evicted every `evict_every` writes.
+    """
+
+    def __init__(self, path: Path = CACHE_DIR / "shared.sqlite3", max_entries: int = 100_000, evict_every: int = 200):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires, last_used FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or row[1] < now:
+            return None
+        if row[2] < now - 60:
+            # Recency only needs minute resolution; avoids a write on every hit
+            with conn:
+                conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, value, expires, last_used) VALUES (?, ?, ?, ?)",
+                         (key, value, now + ttl, now))
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self._evict(conn)
+
+    def clear(self, prefix: Optional[str] = None):
+        conn = self._conn()
+        with conn:
+            if prefix is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def stats(self) -> dict:
+        (size,) = self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()
+        return {"backend": "sqlite", "path": str(self.path), "size": size}
+
+    def _evict(self, conn: sqlite3.Connection):
+        with conn:
+            conn.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+            (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+class RedisBackend:
+    """
+    Any Redis-compatible server (Redis, Valkey, KeyDB, ...). TTLs are native; size
+    eviction is the server's job (maxmemory + an allkeys-lru policy).
+    """
+
+    def __init__(self, url: str, prefix: str = "navigator:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: float):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def clear(self, prefix: Optional[str] = None):
+        pattern = self.prefix + (prefix or "") + "*"
+        for key in self.client.scan_iter(match=pattern, count=1000):
+            self.client.delete(key)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "size": self.client.dbsize()}
+
+class TieredBackend:
+    """
+    Small in-process LRU in front of a shared backend. Cached values are immutable
+    under versioned keys, so the local copy can only be stale by at most its TTL.
+    """
+
+    def __init__(self, shared, local_size: int = 2048, local_ttl: float = 300.0):
+        self.shared = shared
+        self.local = TTLCache(maxsize=local_size, ttl=local_ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: str, ttl: float):
+        self.local.set(key, value, ttl=min(ttl, self.local.ttl))
+        self.shared.set(key, value, ttl)
+
+    def clear(self, prefix: Optional[str] = None):
+        self.local.clear(prefix)
+        self.shared.clear(prefix)
+
+    def stats(self) -> dict:
+        return {**self.shared.stats(), "local": self.local.stats()}
+
+class NamespacedCache:
+    """
+    Typed view of the shared backend for one kind of value. Keys are hashed together
+    with the namespace, its static `version` (bump when the value's meaning changes,
+    e.g. a prompt template) and a per-call `version` (e.g. the index build stamp), so
+    stale entries are simply never looked up again. Values go through encode/decode
+    (JSON by default). Hit/miss counts are kept per namespace and sent to tracing.
+    """
+
+    def __init__(self, namespace: str, ttl: float, version: str = "1", backend=None,
+                 encode: Callable = json.dumps, decode: Callable = json.loads):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.version = version
+        self._backend = backend
+        self.encode = encode
+        self.decode = decode
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        # Resolved on first use so importing a module doesn't open the cache file
+        return self._backend if self._backend is not None else get_cache_backend()
+
+    def _key(self, key, version) -> str:
+        digest = hashlib.sha256(json.dumps([key, str(version)], ensure_ascii=False, default=str).encode("utf-8"))
+        return f"{self.namespace}:{self.version}:{digest.hexdigest()}"
+
+    def get(self, key, version="", default=None):
+        try:
+            raw = self.backend.get(self._key(key, version))
+        except Exception:
+            # A cache that can't be read is a miss, never an error
+            raw = None
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        incr(f"cache.{self.namespace}.{'miss' if raw is None else 'hit'}")
+        return default if raw is None else self.decode(raw)
+
+    def set(self, key, value, version=""):
+        try:
+            self.backend.set(self._key(key, version), self.encode(value), self.ttl)
+        except Exception:
+            pass
+
+    def clear(self):
+        """
+        Drops this namespace's entries (for every process sharing the backend).
+        """
+        self.backend.clear(f"{self.namespace}:")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else None}
+
+_cache_backend = None
+_cache_backend_lock = threading.Lock()
+
+def get_cache_backend():
+    """
+    The process-wide cache backend, from CACHE_BACKEND:
+    "sqlite" (default; CACHE_PATH, CACHE_MAX_ENTRIES) shared by all processes on the machine,
+    "redis" (CACHE_REDIS_URL) shared across machines, or "memory" for this process only.
+    Shared backends get an in-process LRU (CACHE_LOCAL_SIZE) in front. If the chosen
+    backend can't be opened, the in-process LRU is used alone.
+    """
+    global _cache_backend
+    if _cache_backend is None:
+        with _cache_backend_lock:
+            if _cache_backend is None:
+                _cache_backend = _open_cache_backend(os.getenv("CACHE_BACKEND", "sqlite"))
+    return _cache_backend
+
+def _open_cache_backend(kind: str):
+    local_size = int(os.getenv("CACHE_LOCAL_SIZE", "2048"))
+    try:
+        if kind == "sqlite":
+            shared = SQLiteBackend(
+                path=Path(os.getenv("CACHE_PATH", CACHE_DIR / "shared.sqlite3")),
+                max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "100000")),
+            )
+            return TieredBackend(shared, local_size=local_size)
+        if kind == "redis":
+            shared = RedisBackend(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+            return TieredBackend(shared, local_size=local_size)
+        if kind != "memory":
+            raise ValueError(f"Unknown CACHE_BACKEND: {kind}")
+    except Exception as e:
+        print(f"⚠️ Shared cache unavailable ({e}); using an in-process cache.")
+    return TTLCache(maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "100000")))
+
+def set_cache_backend(backend):
+    """
+    Replaces the process-wide backend (None = reopen from the environment on next use).
+    Namespaced caches without a backend of their own follow the change.
+    """
+    global _cache_backend
+    with _cache_backend_lock:
+        _cache_backend = backend
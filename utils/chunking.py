@@ -0,0 +1,146 @@
+# utils/chunking.py
+"""
+Page- and heading-aware chunking for policy PDFs.
+
+Chunks never cross a page or a section heading, and each one keeps where it came
+from: source file, page, section title and character offsets within the page text.
+A short snippet is precomputed per chunk so results can be shown and cited without
+trimming the full text at request time.
+"""
+import re
+from typing import List, Optional, Tuple
+
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 150
+SNIPPET_CHARS = 240
+
+# "Chapter 2", "Section 4 - Eligibility", "3.1 Documents", "(iv) Widows", "ANNEXURE A"
+_NUMBERED_HEADING = re.compile(
+    r"^(?:(?:chapter|section|part|schedule|annex(?:ure)?|article|clause)\b.*"
+    r"|(?:\d+(?:\.\d+)*|[ivxlc]+|[a-z])[.)]\s+\S.*"
+    r"|\d+(?:\.\d+)+\s+\S.*"
+    r"|\((?:\d+|[ivxlc]+|[a-z])\)\s+\S.*)$",
+    re.IGNORECASE,
+)
+_CAPS_HEADING = re.compile(r"^[A-Z][A-Z0-9 ,&/()'’:-]{3,}$")
+_SENTENCE_END = re.compile(r"(?<=[.!?۔])\s+")
+_BOUNDARIES = ("\n\n", "\n", ". ", "۔ ", "; ", ", ", " ")
+
+def is_heading(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line) > 100 or line.endswith((",", ";", ".", "۔")):
+        return False
+    if _CAPS_HEADING.match(line):
+        return True
+    return bool(_NUMBERED_HEADING.match(line)) and len(line.split()) <= 12
+
+def make_snippet(text: str, max_chars: int = SNIPPET_CHARS) -> str:
+    """
+    The leading sentence(s) of a chunk, cut at a word boundary to at most max_chars.
+    """
+    text = " ".join(str(text).split())
+    if len(text) <= max_chars:
+        return text
+    snippet = ""
+    for sentence in _SENTENCE_END.split(text):
+        candidate = f"{snippet} {sentence}".strip()
+        if len(candidate) > max_chars:
+            break
+        snippet = candidate
+    if not snippet:
+        snippet = text[:max_chars].rsplit(" ", 1)[0]
+    return snippet + ("…" if len(snippet) < len(text) else "")
+
+def _sections(text: str) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Splits page text into (start, end, heading) spans at heading lines.
+    """
+    spans = []
+    start, heading = 0, None
+    pos = 0
+    has_body = False
+    for line in text.splitlines(keepends=True):
+        if is_heading(line):
+            # Consecutive headings ("CHAPTER 2" / "2.1 Eligibility") open a single section
+            if has_body:
+                spans.append((start, pos, heading))
+                start, has_body = pos, False
+            heading = line.strip()
+        elif line.strip():
+            has_body = True
+        pos += len(line)
+    if text[start:].strip():
+        spans.append((start, len(text), heading))
+    return spans
+
+def _strip_leading_headings(text: str) -> str:
+    lines = text.splitlines()
+    while lines and (not lines[0].strip() or is_heading(lines[0])):
+        lines.pop(0)
+    return "\n".join(lines) or text
+
+def _split_range(text: str, start: int, end: int, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Cuts text[start:end] into ranges of at most `size` chars, preferring paragraph,
+    line, sentence and word boundaries, with about `overlap` chars shared between
+    neighbours.
+    """
+    ranges = []
+    pos = start
+    while pos < end:
+        if end - pos <= size:
+            ranges.append((pos, end))
+            break
+        window = text[pos:pos + size]
+        cut = -1
+        for sep in _BOUNDARIES:
+            idx = window.rfind(sep)
+            if idx > size // 3:
+                cut = pos + idx + len(sep)
+                break
+        if cut <= pos:
+            cut = pos + size
+        ranges.append((pos, cut))
+        nxt = max(cut - overlap, pos + 1)
+        # Start the overlap at a word boundary
+        space = text.find(" ", nxt, cut)
+        pos = space + 1 if space != -1 else cut
+
+    trimmed = []
+    for a, b in ranges:
+        while a < b and text[a].isspace():
+            a += 1
+        while b > a and text[b - 1].isspace():
+            b -= 1
+        if b > a:
+            trimmed.append((a, b))
+    return trimmed
+
+def split_policy_pages(pages, source_name: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    """
+    Turns the page Documents of one PDF into chunk Documents with metadata:
+    source_file, page (0-based, as PyPDFLoader reports it), section, start, end
+    (character offsets in the page text) and snippet.
+    """
+    from langchain_core.documents import Document
+
+    chunks = []
+    heading = None
+    for page in pages:
+        text = page.page_content or ""
+        for start, end, section in _sections(text):
+            # A page that starts mid-section inherits the last heading of the previous page
+            section = section or heading
+            for a, b in _split_range(text, start, end, chunk_size, chunk_overlap):
+                chunk_text = text[a:b]
+                metadata = dict(page.metadata)
+                metadata.update({
+                    "source_file": source_name,
+                    "section": section or "",
+                    "start": a,
+                    "end": b,
+                    "snippet": make_snippet(_strip_leading_headings(chunk_text)),
+                })
+                chunks.append(Document(page_content=chunk_text, metadata=metadata))
+            heading = section or heading
+    return chunks
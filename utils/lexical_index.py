@@ -0,0 +1,137 @@
+# utils/lexical_index.py
+
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.cache import normalize_text
+
+INDEX_VERSION = 1
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i in is it its my of on or that the this to was were will with"
+    " can do does get me our shall should their they which who you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into normalized word tokens; works for English, Urdu and Roman Urdu alike.
+    """
+    return [t for t in _TOKEN.findall(normalize_text(text)) if t not in _STOPWORDS and len(t) > 1]
+
+# ---------- BM25 Index ----------
+class BM25Index:
+    """
+    In-memory BM25 inverted index over policy chunks, persisted as JSON next to the
+    vector store. Needs no network or embedding model, so it serves degraded mode.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Tuple[str, dict]] = {}
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._ids: List[str] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        self._avg_len = 0.0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str], metadatas: Iterable[dict]):
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self.docs[doc_id] = (text, dict(metadata or {}))
+            self._dirty = True
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                self.docs.pop(doc_id, None)
+            self._dirty = True
+
+    def search(self, query: str, k: int = 3, where: Optional[dict] = None) -> List[Tuple[str, float]]:
+        """
+        Returns up to k (chunk_id, score) pairs, best first. `where` keeps only chunks
+        whose metadata matches every given key/value.
+        """
+        self._ensure_built()
+        n_docs = len(self._ids)
+        if not n_docs:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_idx, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_idx] / self._avg_len)
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_idx, score in ranked:
+            doc_id = self._ids[doc_idx]
+            if where and not _matches(self.docs[doc_id][1], where):
+                continue
+            results.append((doc_id, score))
+            if len(results) >= k:
+                break
+        return results
+
+    def get(self, doc_id: str) -> Tuple[str, dict]:
+        return self.docs[doc_id]
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with self._lock:
+            payload = {"version": INDEX_VERSION, "docs": self.docs}
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        try:
+            payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != INDEX_VERSION:
+            return None
+        index = cls()
+        index.docs = {doc_id: (text, metadata) for doc_id, (text, metadata) in payload["docs"].items()}
+        return index
+
+    def _ensure_built(self):
+        if not self._dirty:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            ids = list(self.docs)
+            postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+            lengths = []
+            for doc_idx, doc_id in enumerate(ids):
+                tokens = tokenize(self.docs[doc_id][0])
+                lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    postings[term].append((doc_idx, tf))
+            self._ids = ids
+            self._postings = dict(postings)
+            self._lengths = lengths
+            self._avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+            self._avg_len = self._avg_len or 1.0
+            self._dirty = False
+
+def _matches(metadata: dict, where: dict) -> bool:
+    return all(metadata.get(key) == value for key, value in where.items())
@@ -0,0 +1,386 @@
+# utils/llm_scheduler.py
+"""
+One scheduler in front of every OpenAI chat call in the process, and a second one
+(get_embedding_scheduler) in front of embedding calls.
+
+    with get_scheduler().slot(priority=INTERACTIVE, tokens=estimate) as ticket:
+        resp = client.chat.completions.create(...)
+        ticket.report_usage(resp.usage)
+
+A request is admitted only when it is first in line (lower priority value first,
+then arrival order), a concurrency slot is free, the request and token buckets can
+cover it and no 429 back-off is in force. Failing requests trip a circuit breaker;
+while it is open, slot() raises CircuitOpenError straight away so callers switch to
+their degraded output instead of queueing behind a dead API. coalesce() lets
+concurrent identical prompts share one request.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional
+
+from utils.tracing import incr
+
+INTERACTIVE = 0
+BATCH = 10
+
+class LLMUnavailable(RuntimeError):
+    """
+    The request was not sent; the caller should use its fallback output.
+    """
+
+class CircuitOpenError(LLMUnavailable):
+    pass
+
+class QueueTimeout(LLMUnavailable):
+    pass
+
+def is_transient_error(exc: BaseException) -> bool:
+    """
+    Timeouts, connection errors, 429s and 5xx are worth retrying; anything else is not.
+    """
+    if isinstance(exc, LLMUnavailable):
+        return False
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # asyncio.TimeoutError is matched by name so asyncio isn't imported at startup
+    if type(exc).__name__ in ("TimeoutError", "APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+def _is_rate_limit(exc: BaseException) -> bool:
+    return type(exc).__name__ == "RateLimitError" or getattr(exc, "status_code", None) == 429
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    # ~4 characters per token for English; Urdu runs denser, so this errs high
+    return len(prompt) // 3 + max_tokens
+
+# ---------- Building Blocks ----------
+class TokenBucket:
+    """
+    Refills continuously at `per_minute / 60` per second up to `per_minute`.
+    Not thread-safe on its own; the scheduler calls it under its lock.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A single request larger than the whole bucket only waits for a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+class CircuitBreaker:
+    """
+    closed → open after `failure_threshold` consecutive failures; open → half-open
+    after `reset_timeout` seconds, letting one trial request through; the trial's
+    outcome closes or re-opens it. A trial that ends without a usable answer (429,
+    cancelled) counts as failed. Not thread-safe on its own.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def allow(self, now: float) -> bool:
+        if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+            self.state, self.trial_in_flight = "half_open", False
+        if self.state == "half_open":
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+        return self.state == "closed"
+
+    def record_success(self):
+        self.state, self.failures, self.trial_in_flight = "closed", 0, False
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                incr("llm.circuit_opened")
+            self.state, self.opened_at, self.trial_in_flight = "open", now, False
+
+class Ticket:
+    def __init__(self, tokens: int, trial: bool = False):
+        self.tokens = tokens
+        self.trial = trial
+        self.used_tokens: Optional[int] = None
+
+    def report_usage(self, usage):
+        """
+        Records the real token count (an OpenAI `usage` object or an int) so the token
+        bucket is corrected for the estimate.
+        """
+        total = usage if isinstance(usage, int) else getattr(usage, "total_tokens", None)
+        if isinstance(total, int):
+            self.used_tokens = total
+
+# ---------- Scheduler ----------
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: float = 500, tokens_per_minute: float = 200_000,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, queue_timeout: float = 30.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._running = 0
+        self._paused_until = 0.0
+        self._backoff = 0.0
+        self._inflight: Dict[object, Future] = {}
+        self._ainflight: Dict[object, object] = {}
+        self._inflight_lock = threading.Lock()
+
+    # ---------- Admission ----------
+    @contextmanager
+    def slot(self, priority: int = INTERACTIVE, tokens: int = 0, timeout: Optional[float] = None):
+        ticket = self._acquire(priority, tokens, timeout)
+        try:
+            yield ticket
+        except BaseException as exc:
+            self._release(ticket, exc)
+            raise
+        self._release(ticket, None)
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = INTERACTIVE, tokens: int = 0, timeout: Optional[float] = None):
+        import asyncio
+
+        # Waiting happens on a worker thread so the event loop never blocks
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._acquire, priority, tokens, timeout))
+        try:
+            ticket = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # Give the slot back if it is granted after the caller went away
+            acquiring.add_done_callback(
+                lambda f: None if f.cancelled() or f.exception() else self._release(f.result(), None, record=False)
+            )
+            raise
+        try:
+            yield ticket
+        except BaseException as exc:
+            self._release(ticket, exc)
+            raise
+        self._release(ticket, None)
+
+    def _acquire(self, priority: int, tokens: int, timeout: Optional[float]) -> Ticket:
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        with self._cond:
+            if not self.breaker.allow(time.monotonic()):
+                incr("llm.circuit_open")
+                raise CircuitOpenError("LLM circuit breaker is open")
+            trial = self.breaker.state == "half_open"
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._admission_wait(entry, tokens, now)
+                    if wait <= 0:
+                        break
+                    if now >= deadline:
+                        incr("llm.queue_timeout")
+                        raise QueueTimeout("Timed out waiting for an LLM slot")
+                    self._cond.wait(min(wait, deadline - now))
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                if trial:
+                    # Nothing was sent, so the next caller gets to run the trial
+                    self.breaker.trial_in_flight = False
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._running += 1
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self._cond.notify_all()
+        return Ticket(tokens, trial)
+
+    def _admission_wait(self, entry, tokens: int, now: float) -> float:
+        """
+        Seconds until `entry` could be admitted (inf = wait to be notified).
+        """
+        if self._waiting[0] != entry or self._running >= self.max_concurrency:
+            return float("inf")
+        wait = self._paused_until - now
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def _release(self, ticket: Ticket, exc: Optional[BaseException], record: bool = True):
+        with self._cond:
+            self._running -= 1
+            now = time.monotonic()
+            if self.tokens and ticket.used_tokens is not None:
+                self.tokens.refund(ticket.tokens - ticket.used_tokens)
+            if exc is not None and _is_rate_limit(exc):
+                # Everyone backs off, not just this caller: honour Retry-After, else double
+                self._backoff = min(30.0, max(1.0, self._backoff * 2))
+                self._paused_until = max(self._paused_until, now + (_retry_after(exc) or self._backoff))
+                incr("llm.rate_limited")
+            elif record:
+                self._backoff = 0.0
+                if exc is not None and is_transient_error(exc):
+                    self.breaker.record_failure(now)
+                elif exc is None or not isinstance(exc, LLMUnavailable):
+                    # Any answer from the API, even a 4xx, shows it is reachable
+                    self.breaker.record_success()
+            if ticket.trial and self.breaker.state == "half_open":
+                # The trial ended without proving the API healthy (429, cancelled,
+                # gave up): treat it as failed so the breaker re-opens and retries later
+                self.breaker.record_failure(now)
+            self._cond.notify_all()
+
+    # ---------- Coalescing ----------
+    def coalesce(self, key, fn: Callable):
+        """
+        Runs fn() once for all concurrent callers with the same key; followers get the
+        leader's result (or exception).
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            incr("llm.coalesced")
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        future.set_result(result)
+        return result
+
+    async def acoalesce(self, key, factory: Callable):
+        """
+        Async coalesce(): factory() returns the coroutine to run once per key and loop.
+        """
+        import asyncio
+
+        key = (id(asyncio.get_running_loop()), key)
+        task = self._ainflight.get(key)
+        if task is not None and not task.done():
+            incr("llm.coalesced")
+        else:
+            task = self._ainflight[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda t: self._ainflight.pop(key, None) if self._ainflight.get(key) is t else None)
+        # shield: one caller being cancelled must not cancel the shared request
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "running": self._running,
+                "waiting": len(self._waiting),
+                "circuit": self.breaker.state,
+                "paused_s": max(0.0, self._paused_until - time.monotonic()),
+            }
+
+# ---------- Process-wide Scheduler ----------
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> LLMScheduler:
+    """
+    The shared scheduler, configured from LLM_MAX_CONCURRENCY, LLM_RPM, LLM_TPM,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_S and LLM_QUEUE_TIMEOUT.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+                    requests_per_minute=float(os.getenv("LLM_RPM", "500")),
+                    tokens_per_minute=float(os.getenv("LLM_TPM", "200000")),
+                    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                    reset_timeout=float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+                    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30")),
+                )
+    return _scheduler
+
+def set_scheduler(scheduler: Optional[LLMScheduler]):
+    """
+    Replaces the shared scheduler (None = rebuild from the environment on next use).
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+# ---------- Embedding Scheduler ----------
+# Embeddings have their own rate limits at OpenAI, so they get their own buckets and
+# breaker: an index build never drains the chat budget or trips the chat breaker.
+_embedding_scheduler: Optional[LLMScheduler] = None
+
+def get_embedding_scheduler() -> LLMScheduler:
+    """
+    The shared scheduler for embedding requests, configured from EMBED_MAX_CONCURRENCY,
+    EMBED_RPM, EMBED_TPM, EMBED_BREAKER_FAILURES, EMBED_BREAKER_RESET_S and
+    EMBED_QUEUE_TIMEOUT.
+    """
+    global _embedding_scheduler
+    if _embedding_scheduler is None:
+        with _scheduler_lock:
+            if _embedding_scheduler is None:
+                _embedding_scheduler = LLMScheduler(
+                    max_concurrency=int(os.getenv("EMBED_MAX_CONCURRENCY", "8")),
+                    requests_per_minute=float(os.getenv("EMBED_RPM", "3000")),
+                    tokens_per_minute=float(os.getenv("EMBED_TPM", "1000000")),
+                    failure_threshold=int(os.getenv("EMBED_BREAKER_FAILURES", "5")),
+                    reset_timeout=float(os.getenv("EMBED_BREAKER_RESET_S", "30")),
+                    queue_timeout=float(os.getenv("EMBED_QUEUE_TIMEOUT", "30")),
+                )
+    return _embedding_scheduler
+
+def set_embedding_scheduler(scheduler: Optional[LLMScheduler]):
+    """
+    Replaces the embedding scheduler (None = rebuild from the environment on next use).
+    """
+    global _embedding_scheduler
+    with _scheduler_lock:
+        _embedding_scheduler = scheduler
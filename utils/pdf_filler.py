@@ -1,92 +1,367 @@
 # utils/pdf_filler.py
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
+"""
+Template-driven application PDFs.
+
+Each service is laid out by a JSON template in /templates (a list of sections:
+header, fields, list, paragraph, note, signature). reportlab's flowable layout does
+the wrapping and page breaks, so nothing is truncated. Fonts, paragraph styles and
+shaped Urdu (RTL) runs are set up once per process and reused by every render;
+render_application_pdfs renders a whole batch with that shared setup.
+
+Urdu needs an Arabic-script TrueType font (PDF_URDU_FONT, else Noto or DejaVu if
+installed) plus the optional arabic-reshaper and python-bidi packages; without them
+the Urdu section is left out.
+"""
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
 from pathlib import Path
+from typing import Iterable, List, Optional, Union
+from xml.sax.saxutils import escape
+import json
+import os
+import threading
+import time
+import uuid
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+DEFAULT_TEMPLATE = "utility_form"
+_MARGIN_MM = 20
+_FRAME_WIDTH_MM = 210 - 2 * _MARGIN_MM  # A4
+
+URDU_FONT_NAME = "NavigatorUrdu"
+URDU_FONT_CANDIDATES = [
+    os.getenv("PDF_URDU_FONT", ""),
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf",
+    "/usr/share/fonts/opentype/noto/NotoNaskhArabic-Regular.ttf",
+]
+# Urdu-only letters; many Arabic fonts lack their presentation forms
+URDU_COVERAGE_SAMPLE = "ہے ۓ ٹ ڈ ڑ ں ھ گ"
+
+_fonts: Optional[dict] = None
+_fonts_lock = threading.Lock()
 
 def generate_application_pdf(service_key: str, form_data: dict, eligibility: bool, reasons: list,
-                             explanation_en: str, required_docs: list, file_path: Path):
-    c = canvas.Canvas(str(file_path), pagesize=A4)
-    width, height = A4
-    x = 20 * mm
-    y = height - 20 * mm
-
-    # Header
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(x, y, "Citizen Service Navigator — Application Summary")
-    y -= 8 * mm
-    c.setFont("Helvetica", 11)
-    c.drawString(x, y, f"Service: {service_key}")
-    y -= 6 * mm
-    c.drawString(x, y, f"Decision: {'Eligible' if eligibility else 'Not eligible'}")
-    y -= 10 * mm
-
-    # Applicant info
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(x, y, "Applicant Information")
-    y -= 7 * mm
-    c.setFont("Helvetica", 10)
-    for k, v in form_data.items():
-        c.drawString(x, y, f"- {k}: {v}"[:120])
-        y -= 5 * mm
-        if y < 30 * mm:
-            c.showPage()
-            y = height - 20 * mm
-            c.setFont("Helvetica", 10)
-
-    # Reasons
-    y -= 4 * mm
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(x, y, "Reasons")
-    y -= 7 * mm
-    c.setFont("Helvetica", 10)
-    if reasons:
-        for r in reasons:
-            c.drawString(x, y, f"- {r}"[:120])
-            y -= 5 * mm
-            if y < 30 * mm:
-                c.showPage()
-                y = height - 20 * mm
-                c.setFont("Helvetica", 10)
-    else:
-        c.drawString(x, y, "- N/A")
-        y -= 5 * mm
-
-    # Explanation
-    y -= 4 * mm
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(x, y, "Plain-language Explanation (English)")
-    y -= 7 * mm
-    c.setFont("Helvetica", 10)
-    for line in wrap_text(explanation_en, 110):
-        c.drawString(x, y, line)
-        y -= 5 * mm
-        if y < 30 * mm:
-            c.showPage()
-            y = height - 20 * mm
-            c.setFont("Helvetica", 10)
-
-    # Required Documents
-    y -= 4 * mm
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(x, y, "Required Documents")
-    y -= 7 * mm
-    c.setFont("Helvetica", 10)
-    if required_docs:
-        for d in required_docs:
-            c.drawString(x, y, f"- {d}"[:120])
-            y -= 5 * mm
-            if y < 30 * mm:
-                c.showPage()
-                y = height - 20 * mm
-                c.setFont("Helvetica", 10)
+                             explanation_en: str, required_docs: list, file_path: Path, citations: list = None):
+    pdf_bytes = render_application_pdf(service_key, form_data, eligibility, reasons, explanation_en, required_docs,
+                                       citations=citations)
+    Path(file_path).write_bytes(pdf_bytes)
+    return str(file_path)
+
+def render_application_pdf(service_key: str, form_data: dict, eligibility: bool, reasons: list,
+                           explanation_en: str, required_docs: list, citations: list = None,
+                           explanation_ur: str = None) -> bytes:
+    """
+    Renders the application summary straight into memory and returns the PDF bytes.
+    citations: policy sources ("file, p. N, §section") listed at the end.
+    explanation_ur: Urdu explanation, rendered right-to-left when shaping is available.
+    """
+    return render_application_pdfs([{
+        "service_key": service_key, "form_data": form_data, "eligibility": eligibility, "reasons": reasons,
+        "explanation_en": explanation_en, "required_docs": required_docs, "citations": citations,
+        "explanation_ur": explanation_ur,
+    }])[0]
+
+def render_application_pdfs(applications: Iterable[dict], combine: bool = False) -> Union[List[bytes], bytes]:
+    """
+    Renders many applications (dicts with render_application_pdf's arguments) in one
+    call. Returns one PDF per application, or a single PDF with each application
+    starting on a new page when combine=True.
+    """
+    # reportlab is only imported once a PDF is actually requested
+    from reportlab.platypus import PageBreak
+
+    stories = [_build_story(app) for app in applications]
+    if combine:
+        story = []
+        for i, part in enumerate(stories):
+            if i:
+                story.append(PageBreak())
+            story.extend(part)
+        return _build_pdf(story)
+    return [_build_pdf(story) for story in stories]
+
+def warm_renderer(service_key: str):
+    """
+    Does the one-off setup for a service's PDF ahead of time: imports reportlab,
+    registers fonts, builds styles and loads the template and field labels.
+    """
+    from reportlab.platypus import SimpleDocTemplate  # noqa: F401
+
+    get_fonts()
+    _styles()
+    template_for_service(service_key)
+    _field_labels(service_key)
+
+# ---------- Templates ----------
+@lru_cache(maxsize=None)
+def load_template(name: str) -> dict:
+    return json.loads((TEMPLATES_DIR / f"{name}.json").read_text(encoding="utf-8"))
+
+@lru_cache(maxsize=None)
+def _service_templates() -> dict:
+    mapping = {}
+    for path in sorted(TEMPLATES_DIR.glob("*.json")):
+        for service_key in load_template(path.stem).get("services", []):
+            mapping[service_key] = path.stem
+    return mapping
+
+def template_for_service(service_key: str) -> dict:
+    return load_template(_service_templates().get(service_key, DEFAULT_TEMPLATE))
+
+@lru_cache(maxsize=None)
+def _text_template(name: str) -> str:
+    return (TEMPLATES_DIR / name).read_text(encoding="utf-8")
+
+@lru_cache(maxsize=None)
+def _field_labels(service_key: str) -> dict:
+    from agents.service_rules import get_service
+
+    service = get_service(service_key)
+    return {q["key"]: q["label"] for q in service.questions} if service else {}
+
+# ---------- Fonts and Urdu Shaping ----------
+def get_fonts() -> dict:
+    """
+    Registers the fonts once per process: {"body", "bold", "urdu"} font names,
+    "urdu" being None when no Arabic-script font or shaping library is available.
+    """
+    global _fonts
+    if _fonts is None:
+        with _fonts_lock:
+            if _fonts is None:
+                _fonts = _register_fonts()
+    return _fonts
+
+def _register_fonts() -> dict:
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont, TTFError
+
+    fonts = {"body": "Helvetica", "bold": "Helvetica-Bold", "urdu": None}
+    if shape_rtl("ا") is None:
+        print("⚠️ arabic-reshaper / python-bidi not installed; Urdu is left out of PDFs.")
+        return fonts
+    for path in URDU_FONT_CANDIDATES:
+        if not path or not Path(path).is_file():
+            continue
+        try:
+            font = TTFont(URDU_FONT_NAME, path)
+        except TTFError:
+            continue
+        if all(ord(c) in font.face.charToGlyph for c in shape_rtl(URDU_COVERAGE_SAMPLE)):
+            pdfmetrics.registerFont(font)
+            fonts["urdu"] = URDU_FONT_NAME
+            break
     else:
-        c.drawString(x, y, "- None")
-        y -= 5 * mm
+        print("⚠️ No Urdu-capable font found (set PDF_URDU_FONT); Urdu is left out of PDFs.")
+    return fonts
 
-    c.showPage()
-    c.save()
-    return str(file_path)
+@lru_cache(maxsize=8192)
+def shape_rtl(text: str) -> Optional[str]:
+    """
+    Joins Arabic-script letters into their contextual forms and reorders the run
+    into visual (left-to-right drawing) order. None if the shaping libraries are missing.
+    """
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+    except ImportError:
+        return None
+    return get_display(arabic_reshaper.reshape(text))
+
+@lru_cache(maxsize=8192)
+def _shaped_width(word: str, font: str, size: float) -> float:
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    return stringWidth(shape_rtl(word), font, size)
+
+def _rtl_lines(text: str, font: str, size: float, width: float) -> List[str]:
+    """
+    Wraps Urdu text in logical order to fit `width`, then shapes each line, so lines
+    read top to bottom and each one right to left.
+    """
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    space = stringWidth(" ", font, size)
+    lines = []
+    for paragraph in str(text).splitlines():
+        line, line_width = [], 0.0
+        for word in paragraph.split():
+            word_width = _shaped_width(word, font, size)
+            if line and line_width + space + word_width > width:
+                lines.append(shape_rtl(" ".join(line)))
+                line, line_width = [], 0.0
+            line_width += (space if line else 0.0) + word_width
+            line.append(word)
+        if line:
+            lines.append(shape_rtl(" ".join(line)))
+    return lines
+
+# ---------- Layout ----------
+@lru_cache(maxsize=None)
+def _styles() -> dict:
+    from reportlab.lib.enums import TA_RIGHT
+    from reportlab.lib.styles import ParagraphStyle
+
+    fonts = get_fonts()
+    styles = {
+        "title": ParagraphStyle("title", fontName=fonts["bold"], fontSize=14, leading=18, spaceAfter=6),
+        "meta": ParagraphStyle("meta", fontName=fonts["body"], fontSize=11, leading=15),
+        "heading": ParagraphStyle("heading", fontName=fonts["bold"], fontSize=12, leading=15,
+                                  spaceBefore=10, spaceAfter=4),
+        "body": ParagraphStyle("body", fontName=fonts["body"], fontSize=10, leading=13),
+        "bullet": ParagraphStyle("bullet", fontName=fonts["body"], fontSize=10, leading=13, leftIndent=16,
+                                 bulletIndent=2),
+        "note": ParagraphStyle("note", fontName="Helvetica-Oblique", fontSize=9, leading=12, spaceBefore=8),
+    }
+    if fonts["urdu"]:
+        styles["urdu_heading"] = ParagraphStyle("urdu_heading", parent=styles["heading"], fontName=fonts["urdu"],
+                                                alignment=TA_RIGHT)
+        styles["urdu"] = ParagraphStyle("urdu", fontName=fonts["urdu"], fontSize=11, leading=17, alignment=TA_RIGHT)
+    return styles
+
+def _markup(text) -> str:
+    return escape(str(text)).replace("\n", "<br/>")
+
+def _build_story(app: dict) -> list:
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+    styles = _styles()
+    template = template_for_service(app["service_key"])
+    values = {**app, "date": datetime.now().strftime("%Y-%m-%d")}
+    story = []
+    for section in template["sections"]:
+        kind = section["type"]
+        source = values.get(section.get("source", ""))
+        if section.get("optional") and not source:
+            continue
+        if kind == "paragraph" and section.get("rtl"):
+            if styles.get("urdu"):
+                story.append(Paragraph(_markup(shape_rtl(section["title"])), styles["urdu_heading"]))
+                width = _FRAME_WIDTH_MM * mm
+                story.extend(Paragraph(_markup(line), styles["urdu"])
+                             for line in _rtl_lines(source, styles["urdu"].fontName, styles["urdu"].fontSize, width))
+            continue
+        if section.get("title"):
+            story.append(Paragraph(_markup(section["title"]), styles["heading"]))
+
+        if kind == "header":
+            story.append(Paragraph(_markup(template["title"]), styles["title"]))
+            story.append(Paragraph(_markup(f"Service: {app['service_key']}"), styles["meta"]))
+            story.append(Paragraph(_markup(f"Decision: {'Eligible' if app['eligibility'] else 'Not eligible'}"),
+                                   styles["meta"]))
+            story.append(Paragraph(_markup(f"Date: {values['date']}"), styles["meta"]))
+        elif kind == "fields":
+            labels = _field_labels(app["service_key"])
+            rows = [[Paragraph(_markup(labels.get(k, k)), styles["body"]), Paragraph(_markup(v), styles["body"])]
+                    for k, v in (app.get("form_data") or {}).items()]
+            if rows:
+                table = Table(rows, colWidths=[70 * mm, (_FRAME_WIDTH_MM - 70) * mm])
+                table.setStyle(TableStyle([
+                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                    ("LINEBELOW", (0, 0), (-1, -1), 0.25, "#cccccc"),
+                ]))
+                story.append(table)
+            else:
+                story.append(Paragraph("- N/A", styles["body"]))
+        elif kind == "list":
+            items = list(source or [])
+            bullet = "[ ]" if section.get("checkbox") else "-"
+            for item in items or [section.get("empty", "N/A")]:
+                story.append(Paragraph(_markup(item), styles["bullet"], bulletText=bullet))
+        elif kind == "paragraph":
+            text = str(source or "")
+            if section.get("template"):
+                text = _text_template(section["template"]).format(
+                    explanation=text, date=values["date"], service_key=app["service_key"]
+                ).strip()
+            story.append(Paragraph(_markup(text), styles["body"]))
+        elif kind == "note":
+            story.append(Paragraph(_markup(section["text"]), styles["note"]))
+        elif kind == "signature":
+            story.append(Spacer(1, 14 * mm))
+            cells = [[Paragraph(_markup(label), styles["body"]) for label in section.get("labels", [])]]
+            table = Table(cells, colWidths=[(_FRAME_WIDTH_MM / max(1, len(cells[0])) - 5) * mm] * len(cells[0]))
+            table.setStyle(TableStyle([("LINEABOVE", (0, 0), (-1, 0), 0.5, "#000000")]))
+            story.append(table)
+        else:
+            raise ValueError(f"Unknown template section type: {kind}")
+    return story
+
+def _build_pdf(story: list) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate
+
+    def footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont("Helvetica", 8)
+        canvas.drawString(_MARGIN_MM * mm, 10 * mm, "Citizen Service Navigator")
+        canvas.drawRightString(A4[0] - _MARGIN_MM * mm, 10 * mm, f"Page {doc.page}")
+        canvas.restoreState()
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=_MARGIN_MM * mm, rightMargin=_MARGIN_MM * mm,
+                            topMargin=_MARGIN_MM * mm, bottomMargin=_MARGIN_MM * mm)
+    doc.build(story, onFirstPage=footer, onLaterPages=footer)
+    return buffer.getvalue()
+
+def application_pdf_name(service_key: str) -> str:
+    """
+    Collision-free file name: timestamp for humans, random suffix for uniqueness.
+    """
+    return f"{service_key}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.pdf"
+
+def save_application_pdf(pdf_bytes: bytes, service_key: str, forms_dir: Path,
+                         max_files: int = 500, max_age_days: float = 30) -> Path:
+    """
+    Persists rendered PDF bytes under forms_dir without ever overwriting another
+    submission, then applies the retention policy to the directory.
+    """
+    forms_dir = Path(forms_dir)
+    forms_dir.mkdir(parents=True, exist_ok=True)
+    while True:
+        path = forms_dir / application_pdf_name(service_key)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            continue
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        break
+    prune_forms_dir(forms_dir, max_files=max_files, max_age_days=max_age_days)
+    return path
+
+def prune_forms_dir(forms_dir: Path, max_files: int = 500, max_age_days: float = 30) -> int:
+    """
+    Deletes PDFs older than max_age_days, then the oldest ones beyond max_files.
+    Returns how many files were removed.
+    """
+    entries = []
+    for path in Path(forms_dir).glob("*.pdf"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    entries.sort()
+
+    cutoff = time.time() - max_age_days * 86400
+    doomed = [p for mtime, p in entries if mtime < cutoff]
+    kept = len(entries) - len(doomed)
+    if kept > max_files:
+        doomed += [p for mtime, p in entries if mtime >= cutoff][:kept - max_files]
+
+    removed = 0
+    for path in doomed:
+        try:
+            path.unlink()
+            removed += 1
+        except OSError:
+            pass
+    return removed
 
 def wrap_text(text: str, max_chars: int):
     words = str(text).split()
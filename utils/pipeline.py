@@ -0,0 +1,302 @@
+# utils/pipeline.py
+"""
+Stateless navigator pipeline: intent → policy search → questions → eligibility →
+explanation → translation → PDF. Every function takes plain values and returns
+JSON-serializable results (or PDF bytes), so the same calls run in-process for
+app.py or behind the HTTP API in api.py.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+
+from agents.intent_agent import detect_service_intent
+from agents.question_agent import get_questions_for_service
+from agents.eligibility_agent import evaluate_service_eligibility
+from utils.translator import (
+    get_openai_client, get_async_openai_client, explain_in_english, explain_in_english_async, explain_and_translate_async,
+    stream_english_explanation, translate_to_urdu, translate_to_urdu_async, stream_urdu_translation,
+)
+from utils.pdf_filler import (
+    render_application_pdf, render_application_pdfs, save_application_pdf, application_pdf_name, warm_renderer,
+)
+from utils.vectorstore import search_policy_hits
+from utils.tracing import export_prometheus, incr, observe, snapshot, span
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FORMS_DIR = BASE_DIR / "forms"
+
+load_dotenv(BASE_DIR / ".env")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
+
+# Keep a copy of generated PDFs in /forms (bounded by count and age)
+PERSIST_FORMS = os.getenv("PERSIST_FORMS", "1") != "0"
+FORMS_MAX_FILES = int(os.getenv("FORMS_MAX_FILES", "500"))
+FORMS_MAX_AGE_DAYS = float(os.getenv("FORMS_MAX_AGE_DAYS", "30"))
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+def api_available() -> bool:
+    return bool(OPENAI_API_KEY)
+
+def get_llm_client(degraded: bool = False):
+    """
+    Process-wide OpenAI client, or None in degraded mode / without an API key.
+    """
+    global _client
+    if degraded or not OPENAI_API_KEY:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = get_openai_client(OPENAI_API_KEY)
+    return _client
+
+def get_async_llm_client(degraded: bool = False):
+    """
+    Process-wide AsyncOpenAI client for the async pipeline calls (api.py's event loop).
+    """
+    global _async_client
+    if degraded or not OPENAI_API_KEY:
+        return None
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = get_async_openai_client(OPENAI_API_KEY)
+    return _async_client
+
+# ---------- Pipeline Steps ----------
+def analyze_request(query: str, degraded: bool = False, k: int = 3) -> dict:
+    """
+    Detects the service and retrieves the top policy sections for it. Each policy
+    result is a PolicyHit dict: text, snippet, score, citation and provenance.
+    """
+    if degraded:
+        incr("degraded_mode")
+    with span("analyze"):
+        with span("intent"):
+            service_key, confidence, rationale = detect_service_intent(query, openai_client=get_llm_client(degraded))
+        if not service_key:
+            return {"service_key": None, "confidence": confidence, "rationale": rationale, "policy_results": []}
+
+        # Degraded mode (or no API key) searches the local lexical index: no network calls.
+        backend = "lexical" if (degraded or not OPENAI_API_KEY) else None
+        with span("search_policy"):
+            hits = search_policy_hits(query, k=k, backend=backend, service=service_key)
+    return {
+        "service_key": service_key,
+        "confidence": confidence,
+        "rationale": rationale,
+        "policy_results": [hit.to_dict() for hit in hits],
+    }
+
+def get_form(service_key: str) -> dict:
+    return {"service_key": service_key, "questions": get_questions_for_service(service_key)}
+
+def check_eligibility(service_key: str, answers: dict, policy_results: Optional[List[Union[dict, str]]] = None) -> dict:
+    """
+    Runs the rule check only (no LLM call), so the decision and required documents
+    can be shown straight away.
+    policy_results: PolicyHit dicts from analyze_request (cited by snippet), or plain
+    section texts from older clients.
+    """
+    hits = [r for r in policy_results or [] if isinstance(r, dict)]
+    texts = [r for r in policy_results or [] if isinstance(r, str)]
+    with span("eligibility"):
+        eligible, reasons, required_docs = evaluate_service_eligibility(
+            service_key=service_key,
+            form_data=answers,
+            policy_context="\n\n".join(texts),
+            policy_references=[f"{hit['citation']}: {hit['snippet']}" for hit in hits],
+        )
+    return {
+        "service_key": service_key,
+        "eligible": eligible,
+        "reasons": reasons,
+        "required_docs": required_docs,
+        "citations": list(dict.fromkeys(hit["citation"] for hit in hits)),
+    }
+
+def explain_result(service_key: str, answers: dict, eligible: bool, reasons: List[str], required_docs: List[str],
+                   degraded: bool = False) -> str:
+    """
+    Writes the English explanation for a decision from check_eligibility.
+    """
+    with span("llm.explain"):
+        english_exp = explain_in_english(
+            client=get_llm_client(degraded),
+            service_key=service_key,
+            form_data=answers,
+            eligible=eligible,
+            reasons=reasons,
+            required_docs=required_docs,
+            degraded=degraded,
+        )
+    if not english_exp or len(english_exp.strip()) < 5:
+        english_exp = _empty_explanation(reasons, required_docs)
+    return english_exp
+
+async def explain_result_async(service_key: str, answers: dict, eligible: bool, reasons: List[str],
+                               required_docs: List[str], degraded: bool = False) -> str:
+    """
+    explain_result for an event loop: awaits the model instead of blocking a thread.
+    """
+    with span("llm.explain"):
+        english_exp = await explain_in_english_async(
+            get_async_llm_client(degraded), service_key, answers, eligible, reasons, required_docs, degraded=degraded,
+        )
+    if not english_exp or len(english_exp.strip()) < 5:
+        english_exp = _empty_explanation(reasons, required_docs)
+    return english_exp
+
+def stream_explanation(service_key: str, answers: dict, eligible: bool, reasons: List[str], required_docs: List[str],
+                       degraded: bool = False) -> Iterator[str]:
+    """
+    explain_result, yielded piece by piece as the model writes it.
+    """
+    written = 0
+    # Timed by hand: a span would stay current across the yields (and break if the
+    # generator is abandoned and closed from another context)
+    start = time.perf_counter()
+    try:
+        for part in stream_english_explanation(get_llm_client(degraded), service_key, answers, eligible, reasons,
+                                               required_docs, degraded=degraded):
+            written += len(part.strip())
+            yield part
+    finally:
+        observe("llm.explain", time.perf_counter() - start)
+    if written < 5:
+        yield _empty_explanation(reasons, required_docs)
+
+def _empty_explanation(reasons: List[str], required_docs: List[str]) -> str:
+    return (
+        "✅ Eligibility check complete.\n\n"
+        + "Reason(s): " + "; ".join(reasons if reasons else ["No reasons provided."]) + "\n\n"
+        + "📜 Policy Reference: Based on available documents.\n\n"
+        + ("📁 Required documents: " + ", ".join(required_docs) if required_docs else "")
+    )
+
+def evaluate_request(service_key: str, answers: dict, policy_results: Optional[List[Union[dict, str]]] = None,
+                     degraded: bool = False) -> dict:
+    """
+    Runs the rule check and writes the English explanation.
+    policy_results: as for check_eligibility.
+    """
+    decision = check_eligibility(service_key, answers, policy_results)
+    english_exp = explain_result(service_key, answers, decision["eligible"], decision["reasons"],
+                                 decision["required_docs"], degraded=degraded)
+    return {
+        "service_key": service_key,
+        "eligible": decision["eligible"],
+        "reasons": decision["reasons"],
+        "required_docs": decision["required_docs"],
+        "explanation_en": english_exp,
+        "citations": decision["citations"],
+    }
+
+async def evaluate_request_async(service_key: str, answers: dict,
+                                 policy_results: Optional[List[Union[dict, str]]] = None,
+                                 degraded: bool = False, translate: bool = False) -> dict:
+    """
+    evaluate_request for an event loop. With translate=True the Urdu translation is
+    added as well, started the moment the English explanation is ready.
+    """
+    decision = check_eligibility(service_key, answers, policy_results)
+    result = {key: decision[key] for key in ("service_key", "eligible", "reasons", "required_docs")}
+    if translate:
+        with span("llm.explain_translate"):
+            english_exp, urdu_exp = await explain_and_translate_async(
+                get_async_llm_client(degraded), service_key, answers, decision["eligible"], decision["reasons"],
+                decision["required_docs"], degraded=degraded,
+            )
+        if not english_exp or len(english_exp.strip()) < 5:
+            english_exp = _empty_explanation(decision["reasons"], decision["required_docs"])
+        result.update(explanation_en=english_exp, explanation_ur=urdu_exp)
+    else:
+        result["explanation_en"] = await explain_result_async(
+            service_key, answers, decision["eligible"], decision["reasons"], decision["required_docs"],
+            degraded=degraded,
+        )
+    result["citations"] = decision["citations"]
+    return result
+
+def translate_explanation(english_text: str, degraded: bool = False) -> dict:
+    with span("llm.translate"):
+        return {"explanation_ur": translate_to_urdu(get_llm_client(degraded), english_text, degraded=degraded)}
+
+async def translate_explanation_async(english_text: str, degraded: bool = False) -> dict:
+    with span("llm.translate"):
+        return {"explanation_ur": await translate_to_urdu_async(get_async_llm_client(degraded), english_text,
+                                                                degraded=degraded)}
+
+def stream_translation(english_text: str, degraded: bool = False) -> Iterator[str]:
+    start = time.perf_counter()
+    try:
+        yield from stream_urdu_translation(get_llm_client(degraded), english_text, degraded=degraded)
+    finally:
+        observe("llm.translate", time.perf_counter() - start)
+
+def prepare_application_pdf(service_key: str):
+    """
+    Sets up the PDF renderer for a service (reportlab, fonts, template), so a PDF
+    job can do it while the explanation it waits for is still being written.
+    """
+    with span("pdf.prepare"):
+        warm_renderer(service_key)
+
+def build_application_pdf(service_key: str, answers: dict, eligible: bool, reasons: List[str],
+                          explanation_en: str, required_docs: List[str],
+                          citations: Optional[List[str]] = None,
+                          explanation_ur: Optional[str] = None) -> Tuple[str, bytes]:
+    """
+    Renders the application PDF in memory, keeps a bounded copy in /forms if enabled,
+    and returns (file_name, pdf_bytes).
+    """
+    with span("pdf.render"):
+        pdf_bytes = render_application_pdf(
+            service_key=service_key,
+            form_data=answers,
+            eligibility=eligible,
+            reasons=reasons,
+            explanation_en=explanation_en,
+            required_docs=required_docs,
+            citations=citations,
+            explanation_ur=explanation_ur,
+        )
+    if PERSIST_FORMS:
+        with span("pdf.save"):
+            pdf_path = save_application_pdf(
+                pdf_bytes, service_key, FORMS_DIR,
+                max_files=FORMS_MAX_FILES, max_age_days=FORMS_MAX_AGE_DAYS,
+            )
+        return pdf_path.name, pdf_bytes
+    return application_pdf_name(service_key), pdf_bytes
+
+def build_application_pdfs(applications: List[dict]) -> bytes:
+    """
+    Renders many applications (dicts with build_application_pdf's arguments) into one
+    combined PDF, one application per page group. Batch output is not kept in /forms.
+    """
+    with span("pdf.render_batch"):
+        return render_application_pdfs([{
+            "service_key": a["service_key"],
+            "form_data": a.get("answers") or {},
+            "eligibility": a["eligible"],
+            "reasons": a.get("reasons") or [],
+            "explanation_en": a.get("explanation_en") or "",
+            "required_docs": a.get("required_docs") or [],
+            "citations": a.get("citations"),
+            "explanation_ur": a.get("explanation_ur"),
+        } for a in applications], combine=True)
+
+# ---------- Metrics ----------
+def metrics(fmt: str = "json"):
+    """
+    Stage latencies and counters: a dict for "json", exposition text for "prometheus".
+    """
+    return export_prometheus() if fmt == "prometheus" else snapshot()
@@ -0,0 +1,174 @@
+# utils/tracing.py
+"""
+Lightweight tracing and metrics for the navigator pipeline.
+
+    with span("search_policy"):
+        ...
+    incr("search.cache_hit")
+    observe("llm.explain", seconds)
+
+Spans record their duration into a per-name reservoir (p50/p95/p99) and, when
+nested, into the trace of the outermost span. Tracing is off unless
+NAVIGATOR_TRACING=1 (or set_tracing(True)); when off, span() returns a shared
+no-op object and incr() and observe() return immediately.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+RESERVOIR_SIZE = 2048
+RECENT_TRACES = 50
+
+_enabled = os.getenv("NAVIGATOR_TRACING", "0") == "1"
+_lock = threading.Lock()
+_timings: Dict[str, dict] = {}
+_counters: Dict[str, int] = {}
+_traces: deque = deque(maxlen=RECENT_TRACES)
+_current: ContextVar[Optional["_Span"]] = ContextVar("navigator_span", default=None)
+
+def set_tracing(enabled: bool):
+    global _enabled
+    _enabled = bool(enabled)
+
+def tracing_enabled() -> bool:
+    return _enabled
+
+# ---------- Spans ----------
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopSpan()
+
+class _Span:
+    __slots__ = ("name", "parent", "start", "duration", "children", "token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.parent = None
+        self.children: List["_Span"] = []
+        self.duration = 0.0
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self.token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.start
+        _current.reset(self.token)
+        _record(self.name, self.duration)
+        if self.parent is not None:
+            self.parent.children.append(self)
+        else:
+            with _lock:
+                _traces.append(self._as_dict(self.start))
+        return False
+
+    def _as_dict(self, origin: float) -> dict:
+        return {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "children": [c._as_dict(origin) for c in self.children],
+        }
+
+def span(name: str):
+    """
+    Context manager timing one pipeline stage.
+    """
+    if not _enabled:
+        return _NOOP
+    return _Span(name)
+
+def incr(name: str, n: int = 1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def observe(name: str, seconds: float):
+    """
+    Records a duration measured by the caller, for stages a span can't wrap (such as a
+    generator that yields: a span would stay current while it is suspended).
+    """
+    if not _enabled:
+        return
+    _record(name, seconds)
+
+def _record(name: str, seconds: float):
+    with _lock:
+        entry = _timings.get(name)
+        if entry is None:
+            entry = _timings[name] = {"count": 0, "sum": 0.0, "samples": deque(maxlen=RESERVOIR_SIZE)}
+        entry["count"] += 1
+        entry["sum"] += seconds
+        entry["samples"].append(seconds)
+
+# ---------- Snapshots & Export ----------
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+def snapshot() -> dict:
+    """
+    Current timings (ms percentiles over the last RESERVOIR_SIZE samples), counters
+    and the most recent traces.
+    """
+    with _lock:
+        timings = {name: (e["count"], e["sum"], sorted(e["samples"])) for name, e in _timings.items()}
+        counters = dict(_counters)
+        traces = list(_traces)
+    stages = {}
+    for name, (count, total, samples) in sorted(timings.items()):
+        stages[name] = {
+            "count": count,
+            "mean_ms": total / count * 1000 if count else 0.0,
+            "p50_ms": _percentile(samples, 0.50) * 1000,
+            "p95_ms": _percentile(samples, 0.95) * 1000,
+            "p99_ms": _percentile(samples, 0.99) * 1000,
+        }
+    return {"enabled": _enabled, "stages": stages, "counters": counters, "traces": traces}
+
+def export_prometheus(prefix: str = "navigator") -> str:
+    """
+    Prometheus text exposition: one summary per stage plus one counter per event.
+    """
+    snap = snapshot()
+    lines = [
+        f"# HELP {prefix}_stage_seconds Pipeline stage latency.",
+        f"# TYPE {prefix}_stage_seconds summary",
+    ]
+    with _lock:
+        sums = {name: e["sum"] for name, e in _timings.items()}
+    for name, stats in snap["stages"].items():
+        label = _label(name)
+        for q, key in ((0.5, "p50_ms"), (0.95, "p95_ms"), (0.99, "p99_ms")):
+            lines.append(f'{prefix}_stage_seconds{{stage="{label}",quantile="{q}"}} {stats[key] / 1000:.6f}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{label}"}} {sums.get(name, 0.0):.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{label}"}} {stats["count"]}')
+    lines.append(f"# HELP {prefix}_events_total Pipeline events (cache hits, fallbacks, ...).")
+    lines.append(f"# TYPE {prefix}_events_total counter")
+    for name, value in sorted(snap["counters"].items()):
+        lines.append(f'{prefix}_events_total{{event="{_label(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+        _traces.clear()
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
@@ -0,0 +1,189 @@
+# utils/translation_memory.py
+"""
+Reviewed Urdu translations of the fixed phrases eligibility results are built from
+(outcomes, reasons, document names and labels) and the segmenter that applies them.
+
+    plan = get_translation_memory().plan(english_text)
+    plan.pending                  # English runs the memory doesn't know
+    plan.render({run: urdu, ...}) # Urdu; runs without a translation stay in English
+
+Text is split into lines, then sentences. A segment is translated when it is a known
+phrase or "Label: value" with a known label and a known value (or a list of known
+items). Lines starting with "• " quote the English policy documents and are kept
+verbatim. Only the remaining runs need the model.
+"""
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils.cache import normalize_text
+
+# Keys are matched after normalize_text() and without trailing ". : ۔"; the sentence's
+# own final punctuation is re-added in Urdu. Edit with a reviewer: these are shown as-is.
+SEGMENTS: Dict[str, str] = {
+    # Outcomes and labels
+    "Eligible": "آپ اہل ہیں",
+    "Not eligible": "آپ اہل نہیں ہیں",
+    "Reason(s)": "وجوہات",
+    "Required documents": "درکار دستاویزات",
+    "📁 Required documents": "📁 درکار دستاویزات",
+    "📜 Policy Reference": "📜 پالیسی حوالہ",
+    "📜 Policy References": "📜 پالیسی حوالہ جات",
+    "✅ Eligibility check complete": "✅ اہلیت کی جانچ مکمل ہو گئی",
+    "Based on available documents": "دستیاب دستاویزات کی بنیاد پر",
+    "No reasons provided": "کوئی وجہ فراہم نہیں کی گئی",
+    "⚠️ This service is not yet supported. We are working on adding it soon":
+        "⚠️ یہ سروس ابھی دستیاب نہیں۔ ہم اسے جلد شامل کرنے پر کام کر رہے ہیں",
+    # Reasons (agents/service_rules.py)
+    "Meets Zakat criteria (Muslim, needy, income below PKR 60,000)":
+        "زکوٰۃ کی شرائط پوری ہیں (مسلمان، مستحق، ماہانہ آمدنی 60,000 روپے سے کم)",
+    "Does not meet Zakat eligibility conditions": "زکوٰۃ کی اہلیت کی شرائط پوری نہیں ہوتیں",
+    "Eligible for free transport card (Senior citizen with valid CNIC)":
+        "مفت ٹرانسپورٹ کارڈ کے اہل ہیں (درست شناختی کارڈ رکھنے والے بزرگ شہری)",
+    "Does not meet transport card eligibility": "ٹرانسپورٹ کارڈ کی اہلیت کی شرائط پوری نہیں ہوتیں",
+    "Eligible for immunization (Child under 5 and registered)":
+        "حفاظتی ٹیکوں کے اہل ہیں (پانچ سال سے کم عمر اور رجسٹرڈ بچہ)",
+    "Does not meet immunization criteria": "حفاظتی ٹیکوں کی شرائط پوری نہیں ہوتیں",
+    "Eligible for housing support (Low income, large family, first-time applicant, no property)":
+        "رہائشی امداد کے اہل ہیں (کم آمدنی، بڑا خاندان، پہلی بار درخواست، کوئی جائیداد نہیں)",
+    "Does not meet housing support eligibility criteria": "رہائشی امداد کی اہلیت کی شرائط پوری نہیں ہوتیں",
+    # Required documents
+    "CNIC": "شناختی کارڈ",
+    "CNIC copy": "شناختی کارڈ کی کاپی",
+    "Guardian CNIC": "سرپرست کا شناختی کارڈ",
+    "Income certificate": "آمدنی کا سرٹیفکیٹ",
+    "Proof of age": "عمر کا ثبوت",
+    "Birth certificate": "پیدائش کا سرٹیفکیٹ",
+    "No property certificate": "جائیداد نہ ہونے کا سرٹیفکیٹ",
+}
+
+_URDU_PUNCTUATION = {".": "۔", "?": "؟", ":": ":", "!": "!"}
+_TRAILING = " .:۔"
+_LABELLED = re.compile(r"^(?P<label>[^:]{1,40}):\s+(?P<value>.+)$", re.S)
+_SENTENCE_END = re.compile(r"(?<=[.!?])(\s+)")
+_LINE_BREAK = re.compile(r"(\n+)")
+
+class TranslationPlan:
+    """
+    A text split into (english, urdu) pieces; urdu is None where the memory had no match.
+    """
+
+    def __init__(self, pieces: List[Tuple[str, Optional[str]]]):
+        self.pieces = pieces
+
+    @property
+    def pending(self) -> List[str]:
+        """
+        Unknown English runs, in order and without duplicates.
+        """
+        return list(dict.fromkeys(en for en, ur in self.pieces if ur is None))
+
+    @property
+    def complete(self) -> bool:
+        return all(ur is not None for _, ur in self.pieces)
+
+    @property
+    def translated_chars(self) -> int:
+        return sum(len(en) for en, ur in self.pieces if ur is not None and ur != en)
+
+    def render(self, translations: Optional[Dict[str, str]] = None) -> str:
+        translations = translations or {}
+        return "".join(ur if ur is not None else translations.get(en, en) for en, ur in self.pieces).strip()
+
+class TranslationMemory:
+    def __init__(self, segments: Dict[str, str]):
+        self._segments = {self._key(en): ur for en, ur in segments.items()}
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return normalize_text(text).rstrip(_TRAILING)
+
+    def __len__(self):
+        return len(self._segments)
+
+    def __contains__(self, text: str) -> bool:
+        return self._key(text) in self._segments
+
+    def lookup(self, text: str) -> Optional[str]:
+        """
+        The Urdu for one sentence, or None. Handles known phrases and "Label: value".
+        """
+        text = text.strip()
+        urdu = self._segments.get(self._key(text)) or self._labelled(text)
+        if urdu is None:
+            return None
+        end = text.rstrip()[-1:]
+        return urdu + _URDU_PUNCTUATION.get(end, "")
+
+    def _labelled(self, text: str) -> Optional[str]:
+        match = _LABELLED.match(text)
+        if not match:
+            return None
+        label = self._segments.get(self._key(match["label"]))
+        if label is None:
+            return None
+        value = match["value"].strip().rstrip(_TRAILING)
+        urdu = self._segments.get(self._key(value))
+        if urdu is None:
+            # A list of known items, e.g. "CNIC copy, Income certificate"
+            for separator in (";", ","):
+                items = [self._segments.get(self._key(item)) for item in value.split(separator) if item.strip()]
+                if len(items) > 1 and all(items):
+                    urdu = "، ".join(items)
+                    break
+        return f"{label}: {urdu}" if urdu is not None else None
+
+    def plan(self, text: str) -> TranslationPlan:
+        pieces: List[Tuple[str, Optional[str]]] = []
+        for line in _LINE_BREAK.split(text or ""):
+            stripped = line.strip()
+            if not stripped or stripped.startswith("• "):
+                pieces.append((line, line))
+                continue
+            urdu = self.lookup(stripped)
+            if urdu is not None:
+                pieces.append((line, line.replace(stripped, urdu)))
+                continue
+            for i, part in enumerate(_SENTENCE_END.split(line)):
+                # Odd indexes are the whitespace between sentences
+                pieces.append((part, part if i % 2 or not part.strip() else self.lookup(part)))
+        return TranslationPlan(_merge_unknown(pieces))
+
+def _merge_unknown(pieces: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Joins unknown pieces separated only by whitespace, so the model translates whole
+    passages rather than sentence fragments.
+    """
+    merged: List[Tuple[str, Optional[str]]] = []
+    for en, ur in pieces:
+        if ur is None and merged and merged[-1][1] is None:
+            merged[-1] = (merged[-1][0] + en, None)
+        elif ur is None and len(merged) >= 2 and merged[-2][1] is None and not merged[-1][0].strip():
+            gap, _ = merged.pop()
+            merged[-1] = (merged[-1][0] + gap + en, None)
+        else:
+            merged.append((en, ur))
+    return merged
+
+def untranslated_phrases() -> List[str]:
+    """
+    Fixed phrases from the service definitions that have no reviewed translation yet.
+    """
+    from agents.service_rules import COMPILED_SERVICES, UNSUPPORTED_SERVICE
+
+    memory = get_translation_memory()
+    phrases = [UNSUPPORTED_SERVICE]
+    for service in COMPILED_SERVICES.values():
+        phrases += [service.eligible_reason, service.not_eligible_reason, *service.required_docs]
+    return [p for p in dict.fromkeys(phrases) if p not in memory]
+
+_memory: Optional[TranslationMemory] = None
+_memory_lock = threading.Lock()
+
+def get_translation_memory() -> TranslationMemory:
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = TranslationMemory(SEGMENTS)
+    return _memory
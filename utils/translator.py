@@ -1,53 +1,326 @@
 # utils/translator.py
+import os
+
+from utils.cache import NamespacedCache
+from utils.llm_scheduler import INTERACTIVE, CircuitOpenError, estimate_tokens, get_scheduler, is_transient_error
+from utils.tracing import incr, span
+from utils.translation_memory import get_translation_memory
+
+MODEL = "gpt-4o-mini"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+
+URDU_OFFLINE_BANNER = "❗ آف لائن موڈ: اردو ترجمہ فی الحال دستیاب نہیں۔\n\n"
+URDU_UNAVAILABLE = "❗ ترجمہ دستیاب نہیں۔"
+
+# Bump when a change outside the prompt text (temperature, post-processing) alters outputs
+PROMPT_VERSION = "1"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+
+# Identical outcomes produce identical prompts, so their completions are reused. Keys
+# are the prompts themselves, so editing a template invalidates its entries.
+_explanations = NamespacedCache("llm.explanation", ttl=LLM_CACHE_TTL, version=f"{MODEL}:{PROMPT_VERSION}")
+_translations = NamespacedCache("llm.translation", ttl=LLM_CACHE_TTL, version=f"{MODEL}:{PROMPT_VERSION}")
+
 def get_openai_client(api_key: str):
     if not api_key:
         return None
     try:
         from openai import OpenAI
-        return OpenAI(api_key=api_key)
+        # Retries are handled here (with backoff), not inside the SDK.
+        return OpenAI(api_key=api_key, timeout=LLM_TIMEOUT, max_retries=0)
     except Exception:
         return None
 
-def explain_in_english(client, service_key, form_data, eligible, reasons, required_docs, degraded=False, max_tokens=220):
-    status = "Eligible" if eligible else "Not eligible"
-    base = f"{status}. "
-    brief = "; ".join(reasons[:3]) if reasons else ""
-    docs = ", ".join(required_docs[:4]) if required_docs else ""
-    if degraded or client is None:
-        text = f"{base}Reason(s): {brief}. Required documents: {docs}."
-        return text.strip()
-
+def get_async_openai_client(api_key: str):
+    if not api_key:
+        return None
     try:
-        content = f"""
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=api_key, timeout=LLM_TIMEOUT, max_retries=0)
+    except Exception:
+        return None
+
+# ---------- Prompts ----------
+def _explanation_prompt(service_key, eligible, reasons, required_docs):
+    # Citizen inputs are deliberately left out: the explanation is cached and shared
+    # between everyone with the same outcome.
+    status = "Eligible" if eligible else "Not eligible"
+    return f"""
 You are a government service assistant. Write a concise explanation (<= 120 words) for a citizen about their eligibility result.
 Service: {service_key}
 Eligibility: {status}
 Key reasons: {reasons}
 Required documents: {required_docs}
-Citizen inputs (for reference): {form_data}
 Avoid policy jargon; keep it simple, friendly, and instructional.
 """
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
+
+def _translation_prompt(english_text):
+    return f"Translate this into Urdu. Keep it short, simple and friendly:\n\n{english_text}"
+
+def _fallback_explanation(eligible, reasons, required_docs):
+    # One line per part, so every line is a phrase the translation memory knows
+    status = "Eligible" if eligible else "Not eligible"
+    lines = [f"{status}."]
+    if reasons:
+        lines.append(f"Reason(s): {reasons[0]}")
+        lines.extend(reasons[1:3])
+    if required_docs:
+        lines.append(f"Required documents: {', '.join(required_docs[:4])}.")
+    return "\n".join(lines)
+
+# ---------- Completion Calls ----------
+# Every request goes through the shared scheduler (utils/llm_scheduler.py): rate limits,
+# priority, circuit breaker and coalescing of identical concurrent prompts.
+def _retry_policy(asynchronous=False):
+    from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+    retrying_cls = AsyncRetrying if asynchronous else Retrying
+    return retrying_cls(
+        stop=stop_after_attempt(LLM_MAX_ATTEMPTS),
+        wait=wait_exponential_jitter(initial=0.5, max=8),
+        retry=retry_if_exception(is_transient_error),
+        reraise=True,
+    )
+
+def _complete(client, content, max_tokens, priority=INTERACTIVE):
+    scheduler = get_scheduler()
+    tokens = estimate_tokens(content, max_tokens)
+
+    def request():
+        for attempt in _retry_policy():
+            with attempt, scheduler.slot(priority, tokens) as ticket, span("llm.request"):
+                resp = client.chat.completions.create(
+                    model=MODEL,
+                    messages=[{"role": "user", "content": content}],
+                    max_tokens=max_tokens,
+                    temperature=0.2,
+                    timeout=LLM_TIMEOUT,
+                )
+                ticket.report_usage(getattr(resp, "usage", None))
+        return resp.choices[0].message.content.strip()
+
+    return scheduler.coalesce((MODEL, content, max_tokens), request)
+
+async def _acomplete(client, content, max_tokens, priority=INTERACTIVE):
+    import asyncio
+
+    scheduler = get_scheduler()
+    tokens = estimate_tokens(content, max_tokens)
+
+    async def request():
+        async for attempt in _retry_policy(asynchronous=True):
+            with attempt:
+                async with scheduler.aslot(priority, tokens) as ticket:
+                    resp = await asyncio.wait_for(
+                        client.chat.completions.create(
+                            model=MODEL,
+                            messages=[{"role": "user", "content": content}],
+                            max_tokens=max_tokens,
+                            temperature=0.2,
+                        ),
+                        timeout=LLM_TIMEOUT,
+                    )
+                    ticket.report_usage(getattr(resp, "usage", None))
+        return resp.choices[0].message.content.strip()
+
+    return await scheduler.acoalesce((MODEL, content, max_tokens), request)
+
+def _stream_completion(client, content, max_tokens, priority=INTERACTIVE):
+    # The slot is held for the whole stream: it is one request in flight
+    with get_scheduler().slot(priority, estimate_tokens(content, max_tokens)):
+        stream = client.chat.completions.create(
+            model=MODEL,
             messages=[{"role": "user", "content": content}],
             max_tokens=max_tokens,
             temperature=0.2,
+            timeout=LLM_TIMEOUT,
+            stream=True,
         )
-        return resp.choices[0].message.content.strip()
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+# ---------- English Explanation ----------
+def explain_in_english(client, service_key, form_data, eligible, reasons, required_docs, degraded=False, max_tokens=220,
+                       priority=INTERACTIVE):
+    if degraded or client is None:
+        return _fallback_explanation(eligible, reasons, required_docs)
+
+    prompt = _explanation_prompt(service_key, eligible, reasons, required_docs)
+    key = (prompt, max_tokens)
+    cached = _explanations.get(key)
+    if cached is not None:
+        incr("llm.cache_hit")
+        return cached
+    try:
+        text = _complete(client, prompt, max_tokens, priority)
     except Exception:
-        return f"{base}Reason(s): {brief}. Required documents: {docs}."
+        incr("llm.fallback")
+        return _fallback_explanation(eligible, reasons, required_docs)
+    _explanations.set(key, text)
+    return text
 
-def translate_to_urdu(client, english_text: str, degraded=False, max_tokens=220):
+async def explain_in_english_async(client, service_key, form_data, eligible, reasons, required_docs, degraded=False,
+                                   max_tokens=220, priority=INTERACTIVE):
     if degraded or client is None:
-        return "❗ آف لائن موڈ: اردو ترجمہ فی الحال دستیاب نہیں۔\n\n" + english_text
+        return _fallback_explanation(eligible, reasons, required_docs)
+
+    prompt = _explanation_prompt(service_key, eligible, reasons, required_docs)
+    key = (prompt, max_tokens)
+    cached = _explanations.get(key)
+    if cached is not None:
+        incr("llm.cache_hit")
+        return cached
     try:
-        content = f"Translate this into Urdu. Keep it short, simple and friendly:\n\n{english_text}"
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": content}],
-            max_tokens=max_tokens,
-            temperature=0.2,
-        )
-        return resp.choices[0].message.content.strip()
+        text = await _acomplete(client, prompt, max_tokens, priority)
+    except Exception:
+        incr("llm.fallback")
+        return _fallback_explanation(eligible, reasons, required_docs)
+    _explanations.set(key, text)
+    return text
+
+def stream_english_explanation(client, service_key, form_data, eligible, reasons, required_docs, degraded=False,
+                               max_tokens=220):
+    """
+    Yields the explanation piece by piece as the model produces it. Cached and fallback
+    explanations are yielded in one piece; a stream cut short is completed with the fallback.
+    """
+    if degraded or client is None:
+        yield _fallback_explanation(eligible, reasons, required_docs)
+        return
+
+    prompt = _explanation_prompt(service_key, eligible, reasons, required_docs)
+    key = (prompt, max_tokens)
+    cached = _explanations.get(key)
+    if cached is not None:
+        incr("llm.cache_hit")
+        yield cached
+        return
+
+    parts = []
+    try:
+        for delta in _stream_completion(client, prompt, max_tokens):
+            parts.append(delta)
+            yield delta
     except Exception:
-        return "❗ ترجمہ دستیاب نہیں۔"
+        incr("llm.fallback")
+        yield ("\n\n" if parts else "") + _fallback_explanation(eligible, reasons, required_docs)
+        return
+    _explanations.set(key, "".join(parts).strip())
+
+# ---------- Urdu Translation ----------
+# Fixed phrases (outcomes, reasons, document names) come from the reviewed translation
+# memory (utils/translation_memory.py); only the remaining runs go to the model, each
+# cached on its own. Offline, known phrases are still shown in Urdu.
+def _plan_translation(english_text):
+    plan = get_translation_memory().plan(english_text)
+    if plan.translated_chars:
+        incr("llm.tm_hit")
+    return plan
+
+def _offline_urdu(plan, translations=None, banner=URDU_OFFLINE_BANNER):
+    urdu = plan.render(translations)
+    return urdu if plan.complete else banner + urdu
+
+def _failed_urdu(plan, translations):
+    incr("llm.fallback")
+    if not plan.translated_chars and not translations:
+        return URDU_UNAVAILABLE
+    return _offline_urdu(plan, translations, banner=URDU_UNAVAILABLE + "\n\n")
+
+def _cached_translation(run, max_tokens):
+    key = (_translation_prompt(run.strip()), max_tokens)
+    cached = _translations.get(key)
+    if cached is not None:
+        incr("llm.cache_hit")
+    return key, cached
+
+def translate_to_urdu(client, english_text: str, degraded=False, max_tokens=220, priority=INTERACTIVE):
+    plan = _plan_translation(english_text)
+    if plan.complete or degraded or client is None:
+        return _offline_urdu(plan)
+
+    translations = {}
+    try:
+        for run in plan.pending:
+            key, text = _cached_translation(run, max_tokens)
+            if text is None:
+                text = _complete(client, key[0], max_tokens, priority)
+                _translations.set(key, text)
+            translations[run] = text
+    except CircuitOpenError:
+        return _offline_urdu(plan, translations)
+    except Exception:
+        return _failed_urdu(plan, translations)
+    return plan.render(translations)
+
+async def translate_to_urdu_async(client, english_text: str, degraded=False, max_tokens=220, priority=INTERACTIVE):
+    import asyncio
+
+    plan = _plan_translation(english_text)
+    if plan.complete or degraded or client is None:
+        return _offline_urdu(plan)
+
+    async def translate(run):
+        key, text = _cached_translation(run, max_tokens)
+        if text is None:
+            text = await _acomplete(client, key[0], max_tokens, priority)
+            _translations.set(key, text)
+        return text
+
+    runs = plan.pending
+    results = await asyncio.gather(*(translate(run) for run in runs), return_exceptions=True)
+    translations = {run: text for run, text in zip(runs, results) if isinstance(text, str)}
+    failures = [exc for exc in results if isinstance(exc, BaseException)]
+    if any(isinstance(exc, CircuitOpenError) for exc in failures):
+        return _offline_urdu(plan, translations)
+    if failures:
+        return _failed_urdu(plan, translations)
+    return plan.render(translations)
+
+def stream_urdu_translation(client, english_text: str, degraded=False, max_tokens=220):
+    """
+    Yields the Urdu translation piece by piece: phrases from the translation memory at
+    once, the rest as the model produces it. Cached, degraded and failed runs are
+    yielded in one piece.
+    """
+    plan = _plan_translation(english_text)
+    if plan.complete or degraded or client is None:
+        yield _offline_urdu(plan)
+        return
+
+    for run, urdu in plan.pieces:
+        if urdu is not None:
+            yield urdu
+            continue
+        key, cached = _cached_translation(run, max_tokens)
+        if cached is not None:
+            yield cached
+            continue
+        parts = []
+        try:
+            for delta in _stream_completion(client, key[0], max_tokens):
+                parts.append(delta)
+                yield delta
+        except CircuitOpenError:
+            # Too late for the banner; this run stays in English
+            yield run
+            continue
+        except Exception:
+            incr("llm.fallback")
+            if not parts:
+                yield URDU_UNAVAILABLE
+            continue
+        _translations.set(key, "".join(parts).strip())
+
+async def explain_and_translate_async(client, service_key, form_data, eligible, reasons, required_docs, degraded=False):
+    """
+    Returns (english, urdu). The translation starts the moment the English text is ready.
+    """
+    english = await explain_in_english_async(
+        client, service_key, form_data, eligible, reasons, required_docs, degraded=degraded
+    )
+    urdu = await translate_to_urdu_async(client, english, degraded=degraded)
+    return english, urdu
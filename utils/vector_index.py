@@ -0,0 +1,437 @@
+# utils/vector_index.py
+"""
+Dense vector index used by utils/vectorstore.py in place of Chroma's own search.
+
+Vectors are L2-normalised (so inner product = cosine similarity) and stored quantized
+as float32, float16 or int8 (per-row scale) in a .npy matrix that is memory-mapped on
+load, so a large corpus costs page cache rather than heap. Search modes:
+
+    exact  NumPy brute force over the matrix, scored block by block
+    ivf    k-means inverted lists; only the `ivf_nprobe` nearest lists are scanned
+    hnsw   HNSW graph via hnswlib (installed with chromadb as chroma-hnswlib)
+
+ANN structures are built on first search and cached next to the matrix, keyed by
+their parameters, so changing a parameter only rebuilds that structure.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_VERSION = 1
+INDEX_MODES = ("exact", "ivf", "hnsw")
+STORAGE_DTYPES = ("float32", "float16", "int8")
+SCORE_BLOCK_ROWS = 8192  # small enough that dequantized blocks stay in cache
+
+META_NAME = "meta.json"
+VECTORS_NAME = "vectors.npy"
+SCALES_NAME = "scales.npy"
+IVF_NAME = "ivf.npz"
+HNSW_NAME = "hnsw.bin"
+
+DEFAULT_PARAMS = {
+    "ivf_nlist": 0,  # 0 = sqrt(rows)
+    "ivf_nprobe": 8,
+    "ivf_iters": 10,
+    "hnsw_m": 16,
+    "hnsw_ef_construction": 200,
+    "hnsw_ef_search": 64,
+}
+
+def index_params_from_env() -> dict:
+    """
+    ANN parameters from VECTOR_IVF_NLIST, VECTOR_IVF_NPROBE, VECTOR_HNSW_M,
+    VECTOR_HNSW_EF_CONSTRUCTION and VECTOR_HNSW_EF_SEARCH (defaults otherwise).
+    """
+    params = dict(DEFAULT_PARAMS)
+    for name in params:
+        value = os.getenv(f"VECTOR_{name.upper()}")
+        if value:
+            params[name] = int(value)
+    return params
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    if dtype == "float32":
+        return vectors, None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    # int8: symmetric per-row scale, so each row uses the full [-127, 127] range
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k highest finite scores, best first.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top[np.isfinite(scores[top])]
+
+def _dot(codes, scales, query: np.ndarray, rows) -> np.ndarray:
+    scores = np.asarray(codes[rows]).astype(np.float32, copy=False) @ query
+    if scales is not None:
+        scores *= scales[rows]
+    return scores
+
+def _rows_f32(codes, scales, rows) -> np.ndarray:
+    rows_f32 = np.asarray(codes[rows]).astype(np.float32)
+    if scales is not None:
+        rows_f32 *= scales[rows][:, None]
+    return rows_f32
+
+class _Snapshot(NamedTuple):
+    """
+    What one search reads, taken under the lock. Writes replace these arrays (and only
+    append to ids), so a snapshot stays consistent while it is scored without the lock.
+    """
+    codes: np.ndarray
+    scales: Optional[np.ndarray]
+    ids: List[str]
+    mask: np.ndarray
+    ann: object
+
+class DenseIndex:
+    """
+    Id-addressed, quantized vector matrix with exact / IVF / HNSW search.
+
+    add() upserts (a re-added id replaces its old row), remove() tombstones rows and
+    save() compacts them away. `where` filters on the "service" metadata key only.
+    """
+
+    def __init__(self, dtype: str = "float32", mode: str = "exact", params: Optional[dict] = None):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown vector dtype: {dtype}")
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown vector index mode: {mode}")
+        self.dtype = dtype
+        self.mode = mode
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.services: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._pending: List[Tuple[np.ndarray, Optional[np.ndarray]]] = []
+        self._service_codes: Optional[np.ndarray] = None
+        self._service_names: Dict[str, int] = {}
+        self._ann = None
+        self._ann_dir: Optional[Path] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    # ---------- Writes ----------
+    def add(self, ids: Sequence[str], vectors, metadatas: Optional[Iterable[dict]] = None):
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = _normalize(vectors)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in ids]
+        with self._lock:
+            self.remove(ids)
+            for doc_id, metadata in zip(ids, metadatas):
+                self._pos[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                self.services.append((metadata or {}).get("service", ""))
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._pending.append(_quantize(vectors, self.dtype))
+            self._service_codes = None
+            self._ann = None
+
+    def remove(self, ids: Iterable[str]):
+        copied = False
+        with self._lock:
+            for doc_id in ids:
+                pos = self._pos.pop(doc_id, None)
+                if pos is not None:
+                    if not copied:
+                        # Copy on write: searches in flight keep the mask they snapshotted
+                        self._alive, copied = self._alive.copy(), True
+                    self._alive[pos] = False
+
+    # ---------- Search ----------
+    def search(self, vector, k: int = 3, where: Optional[dict] = None,
+               mode: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Returns up to k (id, cosine distance) pairs, nearest first. The lock is held only
+        to take a snapshot (and build the ANN structure once); scoring runs without it,
+        so concurrent searches run in parallel.
+        """
+        query = _normalize(vector)[0]
+        mode = mode or self.mode
+        with self._lock:
+            self._ensure_built()
+            if not self._pos:
+                return []
+            snap = _Snapshot(self._codes, self._scales, self.ids, self._mask(where),
+                             self._ensure_ann(mode) if mode != "exact" else None)
+        if mode == "exact":
+            rows, scores = self._exact(snap, query, k)
+        elif mode == "ivf":
+            rows, scores = self._ivf(snap, query, k)
+        else:
+            rows, scores = self._hnsw(snap, query, k)
+        return [(snap.ids[row], float(1.0 - score)) for row, score in zip(rows, scores)]
+
+    def _mask(self, where: Optional[dict]) -> np.ndarray:
+        mask = self._alive
+        if not where:
+            return mask
+        unsupported = set(where) - {"service"}
+        if unsupported:
+            raise ValueError(f"Unsupported filter keys: {sorted(unsupported)}")
+        if self._service_codes is None:
+            self._service_names = {name: i for i, name in enumerate(sorted(set(self.services)))}
+            self._service_codes = np.array([self._service_names[s] for s in self.services], dtype=np.int32)
+        code = self._service_names.get(where["service"])
+        if code is None:
+            return np.zeros_like(mask)
+        return mask & (self._service_codes == code)
+
+    def _exact(self, snap: _Snapshot, query: np.ndarray, k: int):
+        best_rows, best_scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        for start in range(0, len(snap.mask), SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, len(snap.mask))
+            block_mask = snap.mask[start:end]
+            if not block_mask.any():
+                continue
+            scores = np.where(block_mask, _dot(snap.codes, snap.scales, query, slice(start, end)), -np.inf)
+            top = _top_k(scores, k)
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+        top = _top_k(best_scores, k)
+        return best_rows[top], best_scores[top]
+
+    def _rows_f32(self, rows) -> np.ndarray:
+        return _rows_f32(self._codes, self._scales, rows)
+
+    # ---------- IVF ----------
+    def _ivf(self, snap: _Snapshot, query: np.ndarray, k: int):
+        ivf, mask = snap.ann, snap.mask
+        want = min(k, int(mask.sum()))
+        if want <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ranked = _top_k(ivf["centroids"] @ query, len(ivf["centroids"]))
+        offsets, order = ivf["offsets"], ivf["order"]
+        # A narrow filter can leave the nearest lists empty: widen the probe until k
+        # matches are found, then fall back to an exact scan of the filtered rows
+        nprobe = max(1, self.params["ivf_nprobe"])
+        while True:
+            parts = [order[offsets[c]:offsets[c + 1]] for c in ranked[:nprobe]]
+            rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+            rows = np.sort(rows[mask[rows]])
+            if len(rows) >= want or nprobe >= len(ranked):
+                break
+            nprobe *= 2
+        if len(rows) < want:
+            return self._exact(snap, query, k)
+        scores = _dot(snap.codes, snap.scales, query, rows)
+        top = _top_k(scores, k)
+        return rows[top], scores[top]
+
+    def _build_ivf(self) -> dict:
+        n = len(self.ids)
+        nlist = max(1, min(n, self.params["ivf_nlist"] or int(np.sqrt(n))))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False))
+        data = self._rows_f32(sample)
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+        # Spherical k-means: assign by inner product, re-normalise the means
+        for _ in range(self.params["ivf_iters"]):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            filled = np.bincount(assign, minlength=nlist) > 0
+            centroids[filled] = _normalize(sums[filled])
+
+        labels = np.empty(n, dtype=np.int32)
+        for start in range(0, n, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, n)
+            labels[start:end] = np.argmax(self._rows_f32(slice(start, end)) @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        offsets = np.searchsorted(labels[order], np.arange(nlist + 1))
+        return {"centroids": centroids, "order": order, "offsets": offsets}
+
+    # ---------- HNSW ----------
+    def _hnsw(self, snap: _Snapshot, query: np.ndarray, k: int):
+        graph, mask = snap.ann, snap.mask
+        k = min(k, int(mask.sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        graph.set_ef(max(self.params["hnsw_ef_search"], k))
+        try:
+            if mask.all():
+                labels, distances = graph.knn_query(query, k=k)
+            else:
+                labels, distances = graph.knn_query(query, k=k, filter=lambda label: bool(mask[label]))
+        except (RuntimeError, TypeError):
+            # Too few reachable matches for a narrow filter (or an hnswlib without filters)
+            return self._exact(snap, query, k)
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+    def _build_hnsw(self):
+        import hnswlib
+
+        n = len(self.ids)
+        graph = hnswlib.Index(space="ip", dim=self.dim)
+        graph.init_index(max_elements=n, ef_construction=self.params["hnsw_ef_construction"],
+                         M=self.params["hnsw_m"], random_seed=0)
+        for start in range(0, n, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, n)
+            graph.add_items(self._rows_f32(slice(start, end)), np.arange(start, end))
+        return graph
+
+    # ---------- ANN Cache ----------
+    def _ann_key(self, mode: str) -> dict:
+        prefix = f"{mode}_"
+        return {"rows": len(self.ids), **{k: v for k, v in self.params.items() if k.startswith(prefix)}}
+
+    def _ensure_ann(self, mode: str):
+        key = self._ann_key(mode)
+        if self._ann is not None and self._ann[0] == mode and self._ann[1] == key:
+            return self._ann[2]
+        structure = self._load_ann(mode, key)
+        if structure is None:
+            structure = self._build_ivf() if mode == "ivf" else self._build_hnsw()
+            self._save_ann(mode, key, structure)
+        self._ann = (mode, key, structure)
+        return structure
+
+    def _load_ann(self, mode: str, key: dict):
+        if self._ann_dir is None:
+            return None
+        try:
+            meta = json.loads((self._ann_dir / META_NAME).read_text(encoding="utf-8"))
+            if meta.get("ann", {}).get(mode) != key:
+                return None
+            if mode == "ivf":
+                with np.load(self._ann_dir / IVF_NAME) as data:
+                    return {name: data[name] for name in ("centroids", "order", "offsets")}
+            import hnswlib
+
+            graph = hnswlib.Index(space="ip", dim=self.dim)
+            graph.load_index(str(self._ann_dir / HNSW_NAME), max_elements=key["rows"])
+            return graph
+        except (OSError, ValueError, KeyError, RuntimeError):
+            return None
+
+    def _save_ann(self, mode: str, key: dict, structure):
+        if self._ann_dir is None:
+            return
+        try:
+            if mode == "ivf":
+                tmp = self._ann_dir / f"{IVF_NAME}.tmp.npz"
+                np.savez(tmp, **structure)
+                os.replace(tmp, self._ann_dir / IVF_NAME)
+            else:
+                tmp = self._ann_dir / f"{HNSW_NAME}.tmp"
+                structure.save_index(str(tmp))
+                os.replace(tmp, self._ann_dir / HNSW_NAME)
+            meta_path = self._ann_dir / META_NAME
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            meta.setdefault("ann", {})[mode] = key
+            _write_json(meta_path, meta)
+        except OSError:
+            # Read-only index directory: keep the structure in memory only
+            pass
+
+    # ---------- Persistence ----------
+    def _ensure_built(self):
+        if not self._pending:
+            return
+        blocks = ([(self._codes, self._scales)] if self._codes is not None else []) + self._pending
+        self._codes = np.concatenate([codes for codes, _ in blocks])
+        if self.dtype == "int8":
+            self._scales = np.concatenate([scales for _, scales in blocks])
+        self._pending = []
+
+    def save(self, directory: Path):
+        """
+        Writes the live rows (tombstones dropped) and reopens the matrix memory-mapped.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._ensure_built()
+            keep = self._alive
+            codes = np.asarray(self._codes[keep]) if self._codes is not None else np.zeros((0, self.dim or 0))
+            ids = [doc_id for doc_id, alive in zip(self.ids, keep) if alive]
+            services = [s for s, alive in zip(self.services, keep) if alive]
+
+            _save_npy(directory / VECTORS_NAME, codes)
+            if self.dtype == "int8":
+                _save_npy(directory / SCALES_NAME, self._scales[keep])
+            for stale in (IVF_NAME, HNSW_NAME):
+                (directory / stale).unlink(missing_ok=True)
+            _write_json(directory / META_NAME, {
+                "version": INDEX_VERSION, "dtype": self.dtype, "dim": self.dim,
+                "ids": ids, "services": services, "ann": {},
+            })
+            self._open(directory, ids, services)
+
+    @classmethod
+    def load(cls, directory: Path, mode: str = "exact", params: Optional[dict] = None) -> Optional["DenseIndex"]:
+        directory = Path(directory)
+        try:
+            meta = json.loads((directory / META_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != INDEX_VERSION:
+            return None
+
+        index = cls(dtype=meta["dtype"], mode=mode, params=params)
+        index.dim = meta["dim"]
+        index._open(directory, meta["ids"], meta["services"])
+        return index
+
+    def _open(self, directory: Path, ids: List[str], services: List[str]):
+        self.ids = ids
+        self.services = services
+        self._pos = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._codes = np.load(directory / VECTORS_NAME, mmap_mode="r") if ids else None
+        self._scales = np.load(directory / SCALES_NAME) if ids and self.dtype == "int8" else None
+        self._service_codes = None
+        self._ann = None
+        self._ann_dir = directory
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._ensure_built()
+            return {
+                "rows": len(self),
+                "dim": self.dim,
+                "dtype": self.dtype,
+                "mode": self.mode,
+                "matrix_bytes": int(self._codes.nbytes) if self._codes is not None else 0,
+                "memory_mapped": isinstance(self._codes, np.memmap),
+            }
+
+def _save_npy(path: Path, array: np.ndarray):
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+def _write_json(path: Path, payload: dict):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(payload), encoding="utf-8")
+    os.replace(tmp, path)
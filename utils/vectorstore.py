@@ -1,90 +1,831 @@
 # utils/vectorstore.py
 
+import hashlib
+import itertools
+import json
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Dict, List, Optional
 from dotenv import load_dotenv
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+from utils.cache import NamespacedCache, get_embedding_cache, normalize_text
+from utils.chunking import make_snippet, split_policy_pages
+from utils.lexical_index import BM25Index
+from utils.llm_scheduler import BATCH, CircuitOpenError, QueueTimeout, estimate_tokens, get_embedding_scheduler
+from utils.tracing import incr, span
+
+# langchain / chromadb are heavy to import; they are loaded on first use instead.
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import Chroma
+    from utils.vector_index import DenseIndex
 
 # ---------- Paths ----------
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 VECTOR_DB_DIR = BASE_DIR / "vector_db"
+BUILD_STAMP_NAME = ".build_stamp"
+MANIFEST_NAME = "index_manifest.json"
+MANIFEST_VERSION = 3
+LEXICAL_INDEX_NAME = "lexical_index.json"
+DENSE_INDEX_NAME = "dense_index"
+
+RETRIEVAL_BACKENDS = ("vector", "lexical", "hybrid")
+DEFAULT_BACKEND = os.getenv("RETRIEVAL_BACKEND", "vector")
+# How long an index build keeps retrying an embedding batch the scheduler turns away
+EMBED_BATCH_MAX_WAIT = float(os.getenv("EMBED_BATCH_MAX_WAIT", "900"))
+
+# How the vector backend searches: Chroma's own query, or our dense index (see
+# utils/vector_index.py) in exact, ivf or hnsw mode. The dense index is always kept
+# up to date by build_vectorstore; VECTOR_DTYPE sets its storage type at build time.
+VECTOR_INDEX_MODES = ("chroma", "exact", "ivf", "hnsw")
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "chroma")
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float16")
+
+# Which service each policy PDF belongs to, matched on the start of the file name.
+SERVICE_SOURCES = {
+    "lda": "housing_support",
+    "transport": "ptc_transport",
+    "zakat": "zakat",
+    "health": "health_immunization",
+}
 
 load_dotenv(BASE_DIR / ".env")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
+# ---------- Shared Handle State ----------
+# One open handle per (kind, persist directory), shared by every session in the process.
+_handles: Dict[tuple, dict] = {}
+_handles_lock = threading.Lock()
+# Directories whose handles were pinned by use_vectorstore → a token for the pinned store
+_pinned: Dict[str, str] = {}
+_stats_lock = threading.Lock()
+# Keyed by the index build stamp (plus the pin token, if any), so a rebuild invalidates
+# every process's entries and a pinned store never shares entries with the on-disk one
+_results_cache = NamespacedCache(
+    "search",
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "900")),
+    version=str(MANIFEST_VERSION),
+    encode=lambda hits: json.dumps([asdict(h) for h in hits], ensure_ascii=False),
+    decode=lambda raw: [PolicyHit(**h) for h in json.loads(raw)],
+)
+_stats = {
+    "cold_opens": 0,
+    "last_cold_open_s": None,
+    "queries": 0,
+    "last_query_s": None,
+    "total_query_s": 0.0,
+}
+
 # ---------- Build Vectorstore ----------
-def build_vectorstore(persist_directory: Path = VECTOR_DB_DIR):
+def build_vectorstore(
+    persist_directory: Path = VECTOR_DB_DIR,
+    incremental: bool = True,
+    workers: Optional[int] = None,
+    batch_size: int = 256,
+    max_in_flight: int = 4,
+) -> dict:
     """
     Loads all PDFs from /data, chunks them, embeds them, and stores them in ChromaDB.
+    In incremental mode only chunks of new or changed files are embedded, and chunks
+    belonging to changed or deleted files are removed, using the index manifest.
+
+    PDFs are parsed in a process pool (`workers`), chunked as they arrive, embedded in
+    batches of `batch_size` with at most `max_in_flight` embedding requests running,
+    and written to Chroma batch by batch, so memory stays flat however large the corpus.
+    Returns per-stage throughput stats.
     """
     print("📚 Loading PDF documents...")
-    pdf_files = list(DATA_DIR.glob("*.pdf"))
+    pdf_files = sorted(DATA_DIR.glob("*.pdf"))
     if not pdf_files:
         raise FileNotFoundError("No PDF files found in the /data directory.")
 
-    documents = []
+    manifest = load_manifest(persist_directory) if incremental else None
+    embeddings = make_embeddings(priority=BATCH)
+    vectordb = _chroma_cls()(persist_directory=str(persist_directory), embedding_function=embeddings)
+
+    if manifest is None:
+        # Full rebuild: start from an empty collection so old chunks don't linger.
+        print("🧹 No manifest found (or full rebuild requested); resetting collection...")
+        vectordb.delete_collection()
+        vectordb = _chroma_cls()(persist_directory=str(persist_directory), embedding_function=embeddings)
+        manifest = {"version": MANIFEST_VERSION, "files": {}}
+        lexical = BM25Index()
+        dense = _new_dense_index()
+    else:
+        lexical = _load_lexical_index(persist_directory, vectordb)
+        dense = _load_dense_index(persist_directory, vectordb)
+
+    stats = _new_ingest_stats()
+    old_files = manifest["files"]
+    new_files = {}
+    to_parse = []
     for pdf_file in pdf_files:
-        print(f"📄 Loading: {pdf_file.name}")
-        loader = PyPDFLoader(str(pdf_file))
-        docs = loader.load()
-        documents.extend(docs)
-
-    print(f"✅ Loaded {len(documents)} documents")
-
-    # Split into smaller chunks
-    print("✂️ Splitting documents into chunks...")
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=150,
-        separators=["\n\n", "\n", ".", " "]
-    )
-    split_docs = splitter.split_documents(documents)
-    print(f"📚 Split into {len(split_docs)} chunks")
+        file_hash = _file_sha256(pdf_file)
+        previous = old_files.get(pdf_file.name)
+        if previous and previous["sha256"] == file_hash:
+            new_files[pdf_file.name] = previous
+            stats["files_unchanged"] += 1
+        else:
+            to_parse.append((pdf_file, file_hash))
 
-    # Create embeddings
-    print("🧠 Generating embeddings...")
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+    hashes = dict(to_parse)
+    writer = _BatchWriter(vectordb, lexical, dense, embeddings, batch_size, max_in_flight, stats)
+    wall_start = time.perf_counter()
+    try:
+        for pdf_file, pages, parse_s in _iter_parsed_pdfs([f for f, _ in to_parse], workers):
+            print(f"📄 Parsed: {pdf_file.name} ({len(pages)} pages)")
+            stats["pages"] += len(pages)
+            stats["parse_s"] += parse_s
 
-    # Create Chroma vector store
-    print("💾 Storing embeddings in Chroma vector DB...")
-    vectordb = Chroma.from_documents(
-        documents=split_docs,
-        embedding=embeddings,
-        persist_directory=str(persist_directory)
-    )
+            chunk_start = time.perf_counter()
+            split_docs = split_policy_pages(pages, pdf_file.name)
+            _tag_chunks(split_docs, pdf_file.name)
+            chunk_ids = _chunk_ids(pdf_file.name, split_docs)
+            for cid, doc in zip(chunk_ids, split_docs):
+                doc.metadata["chunk_id"] = cid
+            stats["chunks"] += len(split_docs)
+            stats["chunk_s"] += time.perf_counter() - chunk_start
+
+            previous = old_files.get(pdf_file.name)
+            previous_ids = set(previous["chunks"]) if previous else set()
+            stale = previous_ids - set(chunk_ids)
+            if stale:
+                vectordb.delete(ids=list(stale))
+                lexical.remove(stale)
+                dense.remove(stale)
+                stats["removed"] += len(stale)
+
+            fresh = [(cid, doc) for cid, doc in zip(chunk_ids, split_docs) if cid not in previous_ids]
+            for cid, doc in fresh:
+                writer.add(cid, doc)
 
+            new_files[pdf_file.name] = {"sha256": hashes[pdf_file], "chunks": chunk_ids}
+        writer.close()
+    finally:
+        writer.shutdown()
+    stats["wall_s"] = time.perf_counter() - wall_start
+
+    # Files that disappeared from /data take their chunks with them
+    for name, entry in old_files.items():
+        if name not in new_files and entry["chunks"]:
+            print(f"🗑️ Removing chunks of deleted file: {name}")
+            vectordb.delete(ids=entry["chunks"])
+            lexical.remove(entry["chunks"])
+            dense.remove(entry["chunks"])
+            stats["removed"] += len(entry["chunks"])
+
+    manifest["files"] = new_files
     vectordb.persist()
-    print("✅ Vectorstore built successfully and saved to /vector_db")
+    save_manifest(manifest, persist_directory)
+    lexical.save(Path(persist_directory) / LEXICAL_INDEX_NAME)
+    dense.save(Path(persist_directory) / DENSE_INDEX_NAME)
+    _touch_build_stamp(persist_directory)
+    invalidate_vectorstore(persist_directory)
+    _print_ingest_stats(stats)
+    print(f"✅ Vectorstore updated: {stats['embedded']} chunks embedded, {stats['removed']} removed, "
+          f"{stats['files_unchanged']} files unchanged")
+    return stats
+
+# ---------- Ingestion Pipeline ----------
+def _parse_pdf(path: str):
+    """
+    Process-pool entry point: parses one PDF into page Documents.
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+
+    start = time.perf_counter()
+    pages = PyPDFLoader(path).load()
+    return pages, time.perf_counter() - start
+
+def _iter_parsed_pdfs(pdf_files: List[Path], workers: Optional[int] = None):
+    """
+    Yields (pdf_file, pages, parse_seconds) in completion order. At most two files per
+    worker are queued at a time so parsed pages never pile up ahead of the embedder.
+    """
+    if not pdf_files:
+        return
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pdf_files)))
+    remaining = iter(pdf_files)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_parse_pdf, str(f)): f for f in itertools.islice(remaining, workers * 2)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pdf_file = pending.pop(future)
+                nxt = next(remaining, None)
+                if nxt is not None:
+                    pending[pool.submit(_parse_pdf, str(nxt))] = nxt
+                pages, parse_s = future.result()
+                yield pdf_file, pages, parse_s
+
+class _BatchWriter:
+    """
+    Buffers chunks into batches, embeds up to `max_in_flight` batches concurrently and
+    upserts each finished batch into the Chroma collection, the lexical index and the
+    dense index.
+    """
+
+    def __init__(self, vectordb, lexical, dense, embeddings, batch_size: int, max_in_flight: int, stats: dict):
+        self.vectordb = vectordb
+        self.lexical = lexical
+        self.dense = dense
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.stats = stats
+        self.ids, self.docs = [], []
+        self.pending = set()
+        self.pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed")
+
+    def add(self, chunk_id: str, doc):
+        self.ids.append(chunk_id)
+        self.docs.append(doc)
+        if len(self.ids) >= self.batch_size:
+            self._submit()
+
+    def close(self):
+        if self.ids:
+            self._submit()
+        self._drain(self.pending)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self):
+        if len(self.pending) >= self.max_in_flight:
+            done, _ = wait(self.pending, return_when=FIRST_COMPLETED)
+            self._drain(done)
+        ids, docs = self.ids, self.docs
+        self.ids, self.docs = [], []
+        self.pending.add(self.pool.submit(self._embed, ids, docs))
+
+    def _embed(self, ids, docs):
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents([d.page_content for d in docs])
+        return ids, docs, vectors, time.perf_counter() - start
+
+    def _drain(self, futures):
+        for future in list(futures):
+            self.pending.discard(future)
+            ids, docs, vectors, embed_s = future.result()
+            self.stats["embedded"] += len(ids)
+            self.stats["embed_s"] += embed_s
+
+            start = time.perf_counter()
+            self.vectordb._collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                documents=[d.page_content for d in docs],
+                metadatas=[d.metadata for d in docs],
+            )
+            self.lexical.add(ids, [d.page_content for d in docs], [d.metadata for d in docs])
+            self.dense.add(ids, vectors, [d.metadata for d in docs])
+            self.stats["written"] += len(ids)
+            self.stats["write_s"] += time.perf_counter() - start
+
+def _new_ingest_stats() -> dict:
+    return {
+        "files_unchanged": 0, "pages": 0, "chunks": 0, "embedded": 0, "written": 0, "removed": 0,
+        "parse_s": 0.0, "chunk_s": 0.0, "embed_s": 0.0, "write_s": 0.0, "wall_s": 0.0,
+    }
+
+def _print_ingest_stats(stats: dict):
+    rate = lambda n, s: f"{n / s:,.1f}/s" if s > 0 else "n/a"
+    print("📈 Ingestion throughput (per worker-second of each stage):")
+    print(f"   parse : {stats['pages']} pages   {rate(stats['pages'], stats['parse_s'])}")
+    print(f"   chunk : {stats['chunks']} chunks  {rate(stats['chunks'], stats['chunk_s'])}")
+    print(f"   embed : {stats['embedded']} embeddings  {rate(stats['embedded'], stats['embed_s'])}")
+    print(f"   write : {stats['written']} chunks  {rate(stats['written'], stats['write_s'])}")
+    print(f"   wall  : {stats['wall_s']:.2f}s  ({rate(stats['embedded'], stats['wall_s'])} end-to-end)")
+
+def service_for_source(source: str) -> str:
+    """
+    Maps a policy file name or path to its service key ("" if it belongs to none).
+    """
+    name = Path(str(source)).name.lower()
+    for prefix, service_key in SERVICE_SOURCES.items():
+        if name.startswith(prefix):
+            return service_key
+    return ""
+
+def _tag_chunks(docs, source_name: str):
+    service_key = service_for_source(source_name)
+    for doc in docs:
+        doc.metadata["service"] = service_key
+        doc.metadata["source_file"] = source_name
+
+# ---------- Search Results ----------
+@dataclass(frozen=True)
+class PolicyHit:
+    """
+    One retrieved policy chunk with its score and provenance. `score` is higher-is-better
+    but backend-specific: 1 / (1 + distance) for vector, BM25 for lexical, RRF for hybrid.
+    """
+    text: str
+    snippet: str
+    score: float
+    source_file: str = ""
+    page: Optional[int] = None  # 1-based
+    section: str = ""
+    start: Optional[int] = None
+    end: Optional[int] = None
+    service: str = ""
+    chunk_id: str = ""
+
+    @classmethod
+    def from_chunk(cls, text: str, metadata: Optional[dict], score: float, chunk_id: str = "") -> "PolicyHit":
+        # Chunks indexed before page-aware chunking have no snippet/section/offsets
+        metadata = metadata or {}
+        page = metadata.get("page")
+        return cls(
+            text=text,
+            snippet=metadata.get("snippet") or make_snippet(text),
+            score=float(score),
+            source_file=metadata.get("source_file") or Path(str(metadata.get("source", ""))).name,
+            page=int(page) + 1 if isinstance(page, (int, float)) else None,
+            section=metadata.get("section", ""),
+            start=metadata.get("start"),
+            end=metadata.get("end"),
+            service=metadata.get("service", ""),
+            chunk_id=chunk_id or metadata.get("chunk_id", ""),
+        )
+
+    @property
+    def citation(self) -> str:
+        """
+        Human-readable reference, e.g. "Zakat_Policy.pdf, p. 4, §2. Eligibility".
+        """
+        parts = [self.source_file or "Policy document"]
+        if self.page is not None:
+            parts.append(f"p. {self.page}")
+        if self.section:
+            parts.append(f"§{self.section}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "citation": self.citation}
+
+# ---------- Index Manifest ----------
+def load_manifest(persist_directory: Path = VECTOR_DB_DIR) -> Optional[dict]:
+    """
+    Returns the file/chunk hash manifest of the index, or None if there is none.
+    """
+    path = Path(persist_directory) / MANIFEST_NAME
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def save_manifest(manifest: dict, persist_directory: Path = VECTOR_DB_DIR):
+    path = Path(persist_directory) / MANIFEST_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _chunk_ids(source_name: str, docs) -> List[str]:
+    """
+    Content-derived chunk ids: the same text in the same file always gets the same id.
+    Repeated identical chunks in one file are told apart by their occurrence number.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for doc in docs:
+        text_hash = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+        n = seen.get(text_hash, 0)
+        seen[text_hash] = n + 1
+        ids.append(hashlib.sha256(f"{source_name}\0{text_hash}\0{n}".encode("utf-8")).hexdigest())
+    return ids
 
 # ---------- Load Vectorstore ----------
-def load_vectorstore(persist_directory: Path = VECTOR_DB_DIR) -> Chroma:
+def load_vectorstore(persist_directory: Path = VECTOR_DB_DIR) -> "Chroma":
     """
     Loads the existing vector store from disk.
     """
     print("📥 Loading vectorstore...")
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-    vectordb = Chroma(
+    embeddings = make_embeddings()
+    vectordb = _chroma_cls()(
         persist_directory=str(persist_directory),
         embedding_function=embeddings
     )
     return vectordb
 
+# ---------- Embeddings ----------
+def _chroma_cls():
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma
+
+class CachedEmbeddings:
+    """
+    Wraps an embeddings client with the shared on-disk embedding cache, so repeated
+    queries and unchanged chunk text are never sent to the API twice.
+    """
+
+    def __init__(self, inner, model: str, cache):
+        self.inner = inner
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            # Embed each distinct missing text once, even if it repeats in the batch
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            fresh = dict(zip(unique, self.inner.embed_documents(unique)))
+            self.cache.put_many(self.model, unique, [fresh[t] for t in unique])
+            for i in missing:
+                vectors[i] = fresh[texts[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_many(self.model, [text])[0]
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self.cache.put_many(self.model, [text], [vector])
+        return vector
+
+class ScheduledEmbeddings:
+    """
+    Sends embedding requests through the embedding scheduler at `priority`. Sits under
+    the cache, so only cache misses are charged. BATCH callers (index builds) wait out
+    a full queue or an open breaker, backing off up to `max_wait` seconds, instead of
+    failing the build.
+    """
+
+    def __init__(self, inner, priority: int, max_wait: float = EMBED_BATCH_MAX_WAIT):
+        self.inner = inner
+        self.model = inner.model
+        self.priority = priority
+        self.max_wait = max_wait
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._call(texts, lambda: self.inner.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call([text], lambda: self.inner.embed_query(text))
+
+    def _call(self, texts: List[str], request):
+        scheduler = get_embedding_scheduler()
+        deadline = time.monotonic() + self.max_wait
+        delay = 1.0
+        while True:
+            try:
+                with scheduler.slot(self.priority, estimate_tokens("".join(texts), 0)):
+                    return request()
+            except (QueueTimeout, CircuitOpenError):
+                if self.priority != BATCH or time.monotonic() + delay > deadline:
+                    raise
+                incr("embed.backoff")
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+_embeddings_factory = None
+
+def set_embeddings_factory(factory=None):
+    """
+    Replaces the OpenAI embeddings client (e.g. with a local or fake provider for
+    benchmarks); None restores the default.
+    """
+    global _embeddings_factory
+    _embeddings_factory = factory
+    invalidate_vectorstore()
+
+def make_embeddings(priority: Optional[int] = None):
+    """
+    Returns the embeddings client used for both indexing and search, wrapped with the
+    embedding cache unless it is disabled. With a `priority`, requests that miss the
+    cache go through the embedding scheduler (build_vectorstore passes BATCH).
+    """
+    if _embeddings_factory is not None:
+        return _embeddings_factory()
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+    model = embeddings.model
+    if priority is not None:
+        embeddings = ScheduledEmbeddings(embeddings, priority)
+    cache = get_embedding_cache()
+    if cache is None:
+        return embeddings
+    return CachedEmbeddings(embeddings, model, cache)
+
+# ---------- Shared Vectorstore Handle ----------
+def get_vectorstore(persist_directory: Path = VECTOR_DB_DIR) -> "Chroma":
+    """
+    Returns the process-wide vector store handle, opening it on first use.
+    The handle is reopened if the directory was rebuilt since it was opened.
+    """
+    return _get_handle("vector", persist_directory, load_vectorstore)
+
+def get_lexical_index(persist_directory: Path = VECTOR_DB_DIR) -> BM25Index:
+    """
+    Returns the process-wide BM25 index. Opening it never touches the network.
+    """
+    return _get_handle("lexical", persist_directory, _load_lexical_index)
+
+def get_dense_index(persist_directory: Path = VECTOR_DB_DIR) -> "DenseIndex":
+    """
+    Returns the process-wide dense index (memory-mapped), searching in VECTOR_INDEX mode.
+    """
+    return _get_handle("dense", persist_directory, _load_dense_index)
+
+def get_query_embeddings(persist_directory: Path = VECTOR_DB_DIR):
+    """
+    Process-wide embeddings for queries against the dense index (no Chroma handle needed).
+    """
+    return _get_handle("embeddings", persist_directory, lambda _: make_embeddings())
+
+def _get_handle(kind: str, persist_directory: Path, opener):
+    key = (kind, str(Path(persist_directory).resolve()))
+    stamp = _read_build_stamp(persist_directory)
+    handle = _handles.get(key)
+    if handle is not None and handle["stamp"] == stamp:
+        return handle["value"]
+
+    with _handles_lock:
+        handle = _handles.get(key)
+        if handle is None or handle["stamp"] != stamp:
+            start = time.perf_counter()
+            with span(f"vectorstore.open.{kind}"):
+                value = opener(persist_directory)
+            elapsed = time.perf_counter() - start
+            _handles[key] = {"value": value, "stamp": stamp}
+            with _stats_lock:
+                _stats["cold_opens"] += 1
+                _stats["last_cold_open_s"] = elapsed
+            handle = _handles[key]
+    return handle["value"]
+
+def _load_lexical_index(persist_directory: Path = VECTOR_DB_DIR, vectordb: Optional["Chroma"] = None) -> BM25Index:
+    """
+    Loads the persisted BM25 index. Stores built before it existed are exported once
+    from the Chroma collection (stored text only, no embedding calls).
+    """
+    path = Path(persist_directory) / LEXICAL_INDEX_NAME
+    index = BM25Index.load(path)
+    if index is not None:
+        return index
+
+    index = BM25Index()
+    if vectordb is None:
+        vectordb = _chroma_cls()(persist_directory=str(persist_directory))
+    stored = vectordb.get(include=["documents", "metadatas"])
+    if stored["ids"]:
+        print(f"🔤 Building lexical index from {len(stored['ids'])} stored chunks...")
+        metadatas = []
+        for metadata in stored["metadatas"]:
+            metadata = dict(metadata or {})
+            metadata.setdefault("service", service_for_source(metadata.get("source", "")))
+            metadatas.append(metadata)
+        index.add(stored["ids"], stored["documents"], metadatas)
+        index.save(path)
+    return index
+
+def _new_dense_index() -> "DenseIndex":
+    from utils.vector_index import DenseIndex, index_params_from_env
+
+    mode = VECTOR_INDEX if VECTOR_INDEX != "chroma" else "exact"
+    return DenseIndex(dtype=VECTOR_DTYPE, mode=mode, params=index_params_from_env())
+
+def _load_dense_index(persist_directory: Path = VECTOR_DB_DIR, vectordb: Optional["Chroma"] = None) -> "DenseIndex":
+    """
+    Opens the persisted dense index memory-mapped. Stores built before it existed are
+    exported once from the stored Chroma embeddings (no embedding calls).
+    """
+    from utils.vector_index import DenseIndex, index_params_from_env
+
+    path = Path(persist_directory) / DENSE_INDEX_NAME
+    mode = VECTOR_INDEX if VECTOR_INDEX != "chroma" else "exact"
+    index = DenseIndex.load(path, mode=mode, params=index_params_from_env())
+    if index is not None:
+        return index
+
+    index = _new_dense_index()
+    if vectordb is None:
+        vectordb = _chroma_cls()(persist_directory=str(persist_directory))
+    page, offset = 5000, 0
+    while True:
+        stored = vectordb.get(include=["embeddings", "metadatas"], limit=page, offset=offset)
+        if not stored["ids"]:
+            break
+        index.add(stored["ids"], stored["embeddings"], stored["metadatas"])
+        offset += len(stored["ids"])
+    if len(index):
+        print(f"🧮 Built dense index from {len(index)} stored embeddings")
+        index.save(path)
+    return index
+
+def use_vectorstore(vectordb=None, lexical: Optional[BM25Index] = None, persist_directory: Path = VECTOR_DB_DIR,
+                    dense: Optional["DenseIndex"] = None, embeddings=None):
+    """
+    Pins ready-made handles (any object with `embeddings` and
+    `similarity_search_by_vector_with_relevance_scores`, a BM25Index, a DenseIndex and
+    query embeddings) for a directory, in place of opening them from disk. Used by the
+    benchmarks.
+    """
+    key = str(Path(persist_directory).resolve())
+    stamp = _read_build_stamp(persist_directory)
+    pinned = {"vector": vectordb, "lexical": lexical, "dense": dense,
+              "embeddings": embeddings or getattr(vectordb, "embeddings", None)}
+    with _handles_lock:
+        for kind, value in pinned.items():
+            if value is not None:
+                _handles[(kind, key)] = {"value": value, "stamp": stamp}
+        # A fresh token keys the results cache to these handles only
+        _pinned[key] = uuid.uuid4().hex
+
+def invalidate_vectorstore(persist_directory: Optional[Path] = None):
+    """
+    Drops the cached handle for a directory (or all handles) so the next search reopens it.
+    Cached search results are left alone: they are keyed by build stamp and pin token.
+    """
+    with _handles_lock:
+        if persist_directory is None:
+            _handles.clear()
+            _pinned.clear()
+        else:
+            key = str(Path(persist_directory).resolve())
+            for handle_key in [k for k in _handles if k[1] == key]:
+                del _handles[handle_key]
+            _pinned.pop(key, None)
+
+def warm_vectorstore(persist_directory: Path = VECTOR_DB_DIR, backend: str = DEFAULT_BACKEND) -> threading.Thread:
+    """
+    Opens the shared handles in a background thread so the first search doesn't pay for it.
+    """
+    def _warm():
+        try:
+            if backend in ("vector", "hybrid") and VECTOR_INDEX == "chroma":
+                get_vectorstore(persist_directory)
+            elif backend in ("vector", "hybrid"):
+                get_dense_index(persist_directory)
+                get_query_embeddings(persist_directory)
+            get_lexical_index(persist_directory)
+        except Exception as e:
+            print(f"⚠️ Vectorstore warm-up failed: {e}")
+
+    thread = threading.Thread(target=_warm, name="vectorstore-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def get_vectorstore_stats() -> dict:
+    """
+    Returns cold-open and query timings (seconds) for the shared handle.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avg_query_s"] = stats["total_query_s"] / stats["queries"] if stats["queries"] else None
+    stats["results_cache"] = _results_cache.stats()
+    stats["vector_index"] = VECTOR_INDEX
+    dense = [h["value"] for (kind, _), h in list(_handles.items()) if kind == "dense"]
+    if dense and hasattr(dense[0], "stats"):
+        stats["dense_index"] = dense[0].stats()
+    return stats
+
+def _read_build_stamp(persist_directory: Path) -> Optional[int]:
+    try:
+        return (Path(persist_directory) / BUILD_STAMP_NAME).stat().st_mtime_ns
+    except OSError:
+        return None
+
+def _results_version(persist_directory: Path) -> str:
+    token = _pinned.get(str(Path(persist_directory).resolve()), "")
+    return f"{_read_build_stamp(persist_directory)}:{token}"
+
+def _touch_build_stamp(persist_directory: Path):
+    stamp = Path(persist_directory) / BUILD_STAMP_NAME
+    stamp.parent.mkdir(parents=True, exist_ok=True)
+    stamp.write_text(str(time.time()))
+
 # ---------- Search Function ----------
-def search_policy(query: str, k: int = 3) -> List[str]:
+def search_policy(query: str, k: int = 3, backend: Optional[str] = None, service: Optional[str] = None,
+                  use_cache: bool = True) -> List[str]:
+    """
+    Performs a search on the policy index and returns the text of the top policy
+    sections. See search_policy_hits for scores, snippets and citations.
+    """
+    return [hit.text for hit in search_policy_hits(query, k=k, backend=backend, service=service, use_cache=use_cache)]
+
+def search_policy_hits(query: str, k: int = 3, backend: Optional[str] = None, service: Optional[str] = None,
+                       use_cache: bool = True) -> List[PolicyHit]:
+    """
+    Performs a search on the policy index and returns the top policy sections as PolicyHits.
+    backend: "vector" (OpenAI embeddings + Chroma), "lexical" (local BM25, no network)
+    or "hybrid" (reciprocal-rank fusion of both).
+    service: restrict results to chunks tagged with this service key; falls back to the
+    whole corpus if nothing is tagged (stores built before tagging existed).
+    Results are cached per (backend, index mode, service, normalized query, k) and index
+    build in the shared cache (use_cache=False bypasses it, e.g. for benchmarks).
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in RETRIEVAL_BACKENDS:
+        raise ValueError(f"Unknown retrieval backend: {backend}")
+    if VECTOR_INDEX not in VECTOR_INDEX_MODES:
+        raise ValueError(f"Unknown VECTOR_INDEX mode: {VECTOR_INDEX}")
+
+    cache_key = (backend, VECTOR_INDEX, service or "", normalize_text(query), k)
+    stamp = _results_version(VECTOR_DB_DIR)
+    cached = _results_cache.get(cache_key, version=stamp) if use_cache else None
+    if cached is not None:
+        incr("search.cache_hit")
+        return list(cached)
+    incr("search.cache_miss")
+
+    start = time.perf_counter()
+    results = _search(query, k, backend, {"service": service} if service else None)
+    if not results and service:
+        results = _search(query, k, backend, None)
+    elapsed = time.perf_counter() - start
+    with _stats_lock:
+        _stats["queries"] += 1
+        _stats["last_query_s"] = elapsed
+        _stats["total_query_s"] += elapsed
+    _results_cache.set(cache_key, results, version=stamp)
+    return results
+
+def _search(query: str, k: int, backend: str, where: Optional[dict]) -> List[PolicyHit]:
+    if backend == "vector":
+        return _vector_search(query, k, where)
+    if backend == "lexical":
+        return _lexical_search(query, k, where)
+    return _fuse_rankings([_vector_search(query, k * 4, where), _lexical_search(query, k * 4, where)], k)
+
+def _vector_search(query: str, k: int, where: Optional[dict] = None) -> List[PolicyHit]:
+    if VECTOR_INDEX != "chroma":
+        return _dense_search(query, k, where)
+    vectordb = get_vectorstore()
+    # Embedding and similarity are timed separately: one is an API call, the other local.
+    with span("search.embed"):
+        embedding = vectordb.embeddings.embed_query(query)
+    with span("search.similarity"):
+        results = vectordb.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=where)
+    return [PolicyHit.from_chunk(doc.page_content, doc.metadata, 1.0 / (1.0 + distance))
+            for doc, distance in results]
+
+def _dense_search(query: str, k: int, where: Optional[dict] = None) -> List[PolicyHit]:
+    index = get_dense_index()
+    lexical = get_lexical_index()
+    with span("search.embed"):
+        embedding = get_query_embeddings().embed_query(query)
+    with span(f"search.{index.mode}"):
+        results = index.search(embedding, k=k, where=where)
+    # Text and metadata live in the lexical index, which is built alongside
+    return [PolicyHit.from_chunk(*lexical.get(cid), 1.0 / (1.0 + distance), chunk_id=cid)
+            for cid, distance in results if cid in lexical.docs]
+
+def _lexical_search(query: str, k: int, where: Optional[dict] = None) -> List[PolicyHit]:
+    index = get_lexical_index()
+    with span("search.lexical"):
+        hits = index.search(query, k=k, where=where)
+    return [PolicyHit.from_chunk(*index.get(doc_id), score, chunk_id=doc_id) for doc_id, score in hits]
+
+def _fuse_rankings(rankings: List[List[PolicyHit]], k: int, rrf_k: int = 60) -> List[PolicyHit]:
     """
-    Performs a semantic search on the vector DB and returns top policy sections.
+    Reciprocal-rank fusion: a section ranked high by either backend floats to the top.
+    Hits are matched on chunk id (text for stores without ids); the score is the RRF score.
     """
-    vectordb = load_vectorstore()
-    results = vectordb.similarity_search(query, k=k)
-    return [doc.page_content for doc in results]
+    scores: Dict[str, float] = {}
+    hits: Dict[str, PolicyHit] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            key = hit.chunk_id or hit.text
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            hits.setdefault(key, hit)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [replace(hits[key], score=scores[key]) for key in best]
 
 # ---------- CLI Entry Point ----------
 if __name__ == "__main__":
-    build_vectorstore()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or update the policy vector store.")
+    parser.add_argument("--full", action="store_true", help="Rebuild from scratch instead of updating incrementally.")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parser processes (default: CPU count).")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding/write batch.")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Concurrent embedding requests.")
+    args = parser.parse_args()
+
+    build_vectorstore(
+        incremental=not args.full,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_in_flight=args.max_in_flight,
+    )
     print("✅ Done. You can now query policies using search_policy().")